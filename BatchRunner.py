@@ -0,0 +1,67 @@
+import gc
+import glob
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from ShellEmulator import ShellEmulator
+from OutputSink import MemorySink
+
+# Загруженная VFS для процессов пула: задается до их создания и наследуется при fork,
+# поэтому дерево не сериализуется и страницы памяти остаются общими до первой записи
+_batch_vfs = None
+
+
+def find_scripts(pattern):
+    """Скрипты пакета: файлы директории (без вложенных) или пути по glob-шаблону, по возрастанию"""
+    if os.path.isdir(pattern):
+        paths = (os.path.join(pattern, name) for name in os.listdir(pattern))
+    else:
+        paths = glob.glob(pattern)
+    return sorted(path for path in paths if os.path.isfile(path))
+
+
+def run_one(vfs, script_path, echo):
+    """Выполняет скрипт на собственной версии VFS; возвращает (путь, вывод, код завершения)"""
+    out = MemorySink()
+    try:
+        # fork() за O(1): изменения скрипта не видны следующим скриптам того же процесса
+        shell = ShellEmulator(vfs.fork(), script_path, echo=echo, output=out)
+        status = 0 if shell.run() else 1
+    except (Exception, SystemExit):
+        # Ошибка (и ошибка загрузки скрипта в конструкторе) уже выведена эмулятором в out;
+        # выполнение остановлено на ней, как в run_script_mode, остальные скрипты пакета идут дальше
+        status = 1
+    return script_path, out.getvalue(), status
+
+
+def _run_in_worker(script_path, echo):
+    return run_one(_batch_vfs, script_path, echo)
+
+
+def run_batch(vfs, scripts, jobs=None, echo=True):
+    """Выполняет скрипты на одной загруженной VFS; результаты выдаются в порядке scripts.
+
+    Скрипты распределяются по пулу из `jobs` процессов (по умолчанию — по числу ядер), созданных
+    через fork. Где fork недоступен или процесс один, скрипты выполняются по очереди в текущем.
+    """
+    global _batch_vfs
+    jobs = min(jobs or os.cpu_count() or 1, len(scripts))
+    if jobs < 2 or "fork" not in multiprocessing.get_all_start_methods():
+        for script_path in scripts:
+            yield run_one(vfs, script_path, echo)
+        return
+
+    _batch_vfs = vfs
+    # Объекты дерева уходят из-под сборщика мусора: его проходы в дочерних процессах
+    # не трогают их заголовки и не копируют общие страницы
+    gc.freeze()
+    try:
+        context = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=context) as pool:
+            futures = [pool.submit(_run_in_worker, script_path, echo) for script_path in scripts]
+            for future in futures:
+                yield future.result()
+    finally:
+        gc.unfreeze()
+        _batch_vfs = None
@@ -0,0 +1,97 @@
+import sys
+
+
+class OutputSink:
+    """Буферизованный вывод: строки копятся в списке и пишутся в приемник одним вызовом.
+
+    Наследники реализуют _write(text); сброс происходит при переполнении буфера
+    (по числу строк или по объему текста) и в явных точках — flush() и close().
+    """
+
+    def __init__(self, buffer_lines=4096, buffer_chars=1 << 20):
+        self.buffer_lines = buffer_lines
+        self.buffer_chars = buffer_chars
+        self._buffer = []
+        self._chars = 0
+
+    def line(self, text=""):
+        """Добавляет строку вывода; при переполнении буфера сбрасывает его"""
+        self.write(text)
+        self.write("\n")
+
+    def write(self, text):
+        """Добавляет текст без перевода строки — для потокового вывода больших файлов"""
+        self._buffer.append(text)
+        self._chars += len(text)
+        if len(self._buffer) >= 2 * self.buffer_lines or self._chars >= self.buffer_chars:
+            self.flush()
+
+    def flush(self):
+        """Передает накопленный текст приемнику"""
+        if self._buffer:
+            self._write("".join(self._buffer))
+            self._buffer.clear()
+            self._chars = 0
+
+    def close(self):
+        """Сбрасывает буфер и освобождает приемник"""
+        self.flush()
+
+    def _write(self, text):
+        raise NotImplementedError
+
+
+class TerminalSink(OutputSink):
+    """Вывод в терминал (по умолчанию sys.stdout)"""
+
+    def __init__(self, stream=None, buffer_lines=4096):
+        super().__init__(buffer_lines)
+        self.stream = stream
+
+    def flush(self):
+        super().flush()
+        (self.stream or sys.stdout).flush()
+
+    def _write(self, text):
+        (self.stream or sys.stdout).write(text)
+
+
+class MemorySink(OutputSink):
+    """Вывод в память — для встраивания эмулятора и тестовых прогонов"""
+
+    def __init__(self):
+        super().__init__(buffer_lines=sys.maxsize, buffer_chars=sys.maxsize)
+        self._chunks = []
+
+    def _write(self, text):
+        self._chunks.append(text)
+
+    def getvalue(self):
+        """Возвращает весь накопленный вывод одной строкой"""
+        self.flush()
+        return "".join(self._chunks)
+
+    def clear(self):
+        """Очищает накопленный вывод"""
+        self._buffer.clear()
+        self._chars = 0
+        self._chunks.clear()
+
+
+class FileSink(OutputSink):
+    """Вывод в файл на диске"""
+
+    def __init__(self, path, append=False, buffer_lines=4096):
+        super().__init__(buffer_lines)
+        self.file = open(path, "a" if append else "w", encoding="utf-8")
+
+    def flush(self):
+        super().flush()
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    def _write(self, text):
+        self.file.write(text)
@@ -0,0 +1,190 @@
+import csv
+import io
+import mmap
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from VfsNode import DirectoryNode, Encoding
+
+# Шард меньше этого размера не окупает запуск процесса
+MIN_SHARD_BYTES = 1 << 20
+# Блок для подсчета кавычек без копирования всего шарда
+COUNT_BLOCK = 16 << 20
+
+
+def _count_quotes(mapped, start, end):
+    """Считает символы '"' в диапазоне байт"""
+    count = 0
+    while start < end:
+        stop = min(start + COUNT_BLOCK, end)
+        count += mapped[start:stop].count(b'"')
+        start = stop
+    return count
+
+
+def _next_record(mapped, pos, quotes):
+    """Ищет начало записи CSV не раньше pos.
+
+    Перевод строки разделяет записи, только если до него четное число кавычек
+    (экранированная кавычка "" не меняет четность). Возвращает (позиция, кавычки до нее).
+    """
+    size = len(mapped)
+    while True:
+        newline = mapped.find(b"\n", pos)
+        if newline == -1:
+            return size, quotes
+        quotes += _count_quotes(mapped, pos, newline)
+        pos = newline + 1
+        if quotes % 2 == 0:
+            return pos, quotes
+
+
+def split_shards(path, shards):
+    """Делит CSV на диапазоны байт по границам записей; возвращает (заголовок, [(начало, конец)])"""
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return b"", []
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    with mapped:
+        data_start, quotes = _next_record(mapped, 0, 0)
+        header = mapped[:data_start]
+
+        step = max((size - data_start) // shards, 1)
+        boundaries = [data_start]
+        pos = data_start
+        for i in range(1, shards):
+            nominal = data_start + i * step
+            if nominal <= pos:
+                continue
+            quotes += _count_quotes(mapped, pos, nominal)
+            pos, quotes = _next_record(mapped, nominal, quotes)
+            if pos >= size:
+                break
+            boundaries.append(pos)
+        boundaries.append(size)
+
+    return header, list(zip(boundaries, boundaries[1:]))
+
+
+class ShardBuilder:
+    """Строит поддерево одного шарда по тем же правилам, что и VirtualFileSystem.add_node.
+
+    Для слияния запоминает:
+      explicit_dirs — директории, заданные строками шарда (при слиянии они заменяют узел
+                      целиком, как и при последовательной загрузке);
+      checks        — пути, которые шард прошел как неявные директории, но потом перезаписал;
+                      при последовательной загрузке на них сработала бы проверка
+                      «файл блокирует путь», поэтому ее нужно повторить на общем дереве.
+    """
+
+    def __init__(self):
+        self.root = DirectoryNode()
+        self.explicit_dirs = set()
+        self.checks = []
+
+    def add(self, parts, node):
+        parent = self.root
+        for i in range(len(parts) - 1):
+            child = parent.children.get(parts[i])
+            if child is None:
+                child = parent.children[parts[i]] = DirectoryNode()
+            elif not child.is_dir:
+                raise RuntimeError(f"Невозможно создать '{'/'.join(parts[:i + 1])}': файл блокирует путь")
+            parent = child
+
+        path = tuple(parts)
+        existing = parent.children.get(parts[-1])
+        if existing is not None and existing.is_dir:
+            self._discard(path, existing)
+        parent.children[parts[-1]] = node
+        if node.is_dir:
+            self.explicit_dirs.add(path)
+
+    def _discard(self, path, node):
+        """Учитывает поддерево, которое сейчас будет перезаписано"""
+        covered = any(path[:k] in self.explicit_dirs for k in range(1, len(path)))
+        stack = [(path, node, covered)]
+        while stack:
+            current, directory, covered = stack.pop()
+            if current in self.explicit_dirs:
+                # Проверки внутри явной директории уже не зависят от общего дерева
+                self.explicit_dirs.discard(current)
+                covered = True
+            elif not covered:
+                self.checks.append(current)
+            for name, child in directory.children.items():
+                if child.is_dir:
+                    stack.append((current + (name,), child, covered))
+
+
+def parse_shard(path, start, end, header):
+    """Разбирает шард в отдельном процессе; base64 декодируется здесь же"""
+    from VirtualFileSystem import node_from_row
+
+    csv.field_size_limit(sys.maxsize)
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+
+    fieldnames = next(csv.reader(io.StringIO(header.decode("utf-8"), newline="")))
+    reader = csv.DictReader(io.StringIO(data.decode("utf-8"), newline=""), fieldnames=fieldnames)
+    builder = ShardBuilder()
+    for row in reader:
+        parts, node = node_from_row(row)
+        if not parts:
+            continue
+        if not node.is_dir and node.encoding == Encoding.B64:
+            node.materialize()
+        builder.add(parts, node)
+    return builder.root, builder.explicit_dirs, builder.checks
+
+
+def _check_path(root, path):
+    """Повторяет проверку «файл блокирует путь» для пути на общем дереве"""
+    node = root
+    for i, part in enumerate(path):
+        node = node.children.get(part)
+        if node is None:
+            return
+        if not node.is_dir:
+            raise RuntimeError(f"Невозможно создать '{'/'.join(path[:i + 1])}': файл блокирует путь")
+
+
+def merge_shard(root, shard_root, explicit_dirs, checks):
+    """Вливает поддерево шарда в общее дерево с той же семантикой, что у построчной загрузки"""
+    for path in checks:
+        _check_path(root, path)
+
+    stack = [(root, shard_root, ())]
+    while stack:
+        target, source, prefix = stack.pop()
+        for name, node in source.children.items():
+            path = prefix + (name,)
+            existing = target.children.get(name)
+            if existing is None or not node.is_dir or path in explicit_dirs:
+                target.children[name] = node
+            elif not existing.is_dir:
+                raise RuntimeError(f"Невозможно создать '{'/'.join(path)}': файл блокирует путь")
+            else:
+                stack.append((existing, node, path))
+
+
+def load_parallel(root, path, workers):
+    """Загружает CSV в дерево root, разбирая шарды в пуле процессов.
+
+    Возвращает False, если файл слишком мал для шардирования (тогда грузить нужно обычным способом).
+    """
+    shards = min(workers, os.path.getsize(path) // MIN_SHARD_BYTES)
+    if shards < 2:
+        return False
+
+    header, ranges = split_shards(path, shards)
+    with ProcessPoolExecutor(max_workers=len(ranges)) as pool:
+        futures = [pool.submit(parse_shard, path, start, end, header) for start, end in ranges]
+        # Сливаем строго в порядке шардов, чтобы перезаписи шли как при построчной загрузке
+        for future in futures:
+            merge_shard(root, *future.result())
+    return True
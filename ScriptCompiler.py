@@ -0,0 +1,116 @@
+import shlex
+
+
+class CompiledCommand:
+    """Строка скрипта, разобранная один раз: имя команды, аргументы и обработчик.
+
+    Для конвейера (cmd1 | cmd2) и перенаправления (> файл, >> файл) name/args/handler
+    относятся к первой команде, stages — все команды конвейера по порядку,
+    redirect — (путь, дописывать ли) или None.
+    """
+    __slots__ = ("line", "name", "args", "handler", "error", "stages", "redirect")
+
+    def __init__(self, line, name=None, args=(), handler=None, error=None, stages=None, redirect=None):
+        self.line = line
+        self.name = name
+        self.args = args
+        self.handler = handler  # None — команда не найдена в таблице
+        self.error = error      # текст ошибки парсинга, если строку не удалось разобрать
+        self.stages = stages    # None — простая команда без конвейера и перенаправления
+        self.redirect = redirect
+
+    def is_mutating(self, mutating_commands):
+        """Меняет ли строка дерево VFS: изменяющая команда в конвейере или перенаправление в файл"""
+        if self.stages is None:
+            return self.name in mutating_commands
+        return self.redirect is not None or any(stage.name in mutating_commands for stage in self.stages)
+
+
+def compile_script(lines, commands):
+    """Разбирает все строки скрипта заранее и связывает их с обработчиками из таблицы команд.
+
+    Ошибки не прерывают компиляцию: они сохраняются в командах и срабатывают при
+    выполнении той же строки, поэтому семантика остановки при ошибке не меняется.
+    """
+    program = []
+    compiled = {}  # повторяющиеся строки разбираются один раз
+    for line in lines:
+        command = compiled.get(line)
+        if command is None:
+            command = compiled[line] = compile_line(line, commands)
+        program.append(command)
+    return program
+
+
+def split_pipeline(line):
+    """Делит строку по '|' и выделяет перенаправление '>'/'>>' вне кавычек.
+
+    Возвращает (список строк команд, (цель, дописывать) или None). Перенаправление
+    допускается только в конце строки. При синтаксической ошибке — ValueError, как у shlex.
+    """
+    segments = []
+    redirect = None
+    current = []
+    quote = None
+    i = 0
+    while i < len(line):
+        char = line[i]
+        if quote:
+            current.append(char)
+            if char == quote:
+                quote = None
+            elif char == "\\" and quote == '"' and i + 1 < len(line):
+                current.append(line[i + 1])
+                i += 1
+        elif char in "'\"":
+            quote = char
+            current.append(char)
+        elif char == "\\" and i + 1 < len(line):
+            current.append(line[i:i + 2])
+            i += 1
+        elif char == "|":
+            segments.append("".join(current))
+            current = []
+        elif char == ">":
+            append = line[i + 1:i + 2] == ">"
+            target = shlex.split(line[i + 2 if append else i + 1:])
+            if len(target) != 1:
+                raise ValueError("после '>' ожидается одно имя файла")
+            redirect = (target[0], append)
+            break
+        else:
+            current.append(char)
+        i += 1
+    if quote:
+        raise ValueError("No closing quotation")
+    segments.append("".join(current))
+    return segments, redirect
+
+
+def compile_line(line, commands):
+    """Разбирает одну строку скрипта"""
+    try:
+        if "|" in line or ">" in line:
+            segments, redirect = split_pipeline(line)
+            if len(segments) > 1 or redirect is not None:
+                return _compile_pipeline(line, segments, redirect, commands)
+        parts = shlex.split(line)
+    except ValueError as e:
+        return CompiledCommand(line, error=str(e))
+
+    if not parts:
+        return CompiledCommand(line)
+
+    return CompiledCommand(line, parts[0], tuple(parts[1:]), commands.get(parts[0]))
+
+
+def _compile_pipeline(line, segments, redirect, commands):
+    """Разбирает команды конвейера; пустая команда в нем — синтаксическая ошибка"""
+    stages = []
+    for segment in segments:
+        parts = shlex.split(segment)
+        if not parts:
+            raise ValueError("пустая команда в конвейере")
+        stages.append(CompiledCommand(segment.strip(), parts[0], tuple(parts[1:]), commands.get(parts[0])))
+    first = stages[0]
+    return CompiledCommand(line, first.name, first.args, first.handler, stages=tuple(stages), redirect=redirect)
@@ -1,125 +1,348 @@
+import itertools
+import re
 import shlex
-import socket
-import getpass
+import threading
+from collections import deque, namedtuple
+from functools import lru_cache
 import os
 import sys
-import platform
-from VirtualFileSystem import VirtualFileSystem
+import time
+from VirtualFileSystem import VirtualFileSystem, normalize_path
+from OutputSink import TerminalSink, MemorySink
+from ScriptCompiler import compile_script, compile_line
+
+HostInfo = namedtuple("HostInfo", "user hostname system release version machine")
+
+
+@lru_cache(maxsize=None)
+def host_info():
+    """Пользователь и сведения о системе для приглашения и uname — собираются один раз за процесс.
+
+    Все поля uname берутся одним вызовом os.uname(); getpass (и platform там, где os.uname
+    нет) импортируются только здесь, чтобы не замедлять запуск.
+    """
+    import getpass
+
+    try:
+        uname = os.uname()
+        system = (uname.nodename, uname.sysname, uname.release, uname.version, uname.machine)
+    except AttributeError:  # Windows
+        import platform
+        system = (platform.node(), platform.system(), platform.release(), platform.version(), platform.machine())
+    return HostInfo(getpass.getuser(), *system)
 
 
 class ShellEmulator:
-    def __init__(self, vfs_path, script_path=None):
-        self.username = getpass.getuser()
-        self.hostname = socket.gethostname()
-        self.vfs = VirtualFileSystem(vfs_path)
+    # Команды, изменяющие дерево VFS: при общей VFS (сервер) выполняются монопольно
+    MUTATING_COMMANDS = frozenset({"mv", "mkdir", "touch"})
+    # Сколько интерактивный режим ждет фоновую загрузку, чтобы вывести motd до приветствия (с)
+    MOTD_WAIT = 0.05
+    # Сколько вариантов дополнения по Tab берется из индекса имен директории
+    COMPLETION_LIMIT = 1000
+
+    def __init__(self, vfs_path, script_path=None, echo=True, output=None, stats=False, workers=None,
+                 journal=None, background=False, cache_bytes=None):
+        self.host = host_info()
+        self.username = self.host.user
+        self.hostname = self.host.hostname
+        # Статистика включается явно; без нее команды выполняются без замеров
+        if stats:
+            from ShellStats import ShellStats
+            self.stats = ShellStats()
+        else:
+            self.stats = None
+        self._vfs = None
+        self._vfs_error = None
+        self._loader = None
+        if isinstance(vfs_path, VirtualFileSystem):
+            # Уже загруженная VFS, общая для нескольких эмуляторов
+            self._vfs = vfs_path
+        elif background:
+            # Приглашение появляется сразу; дерева ждет только первая команда, которой оно нужно
+            self._loader = threading.Thread(target=self._load_vfs, args=(vfs_path, workers, journal, cache_bytes),
+                                            name="vfs-loader", daemon=True)
+            self._loader.start()
+        else:
+            self._load_vfs(vfs_path, workers, journal, cache_bytes, raise_errors=True)
         self.current_path = '/home/user'
         self.running = True
         self.script_path = script_path
         self.script_mode = script_path is not None
         self.script_lines = []
         self.script_index = 0
+        self.echo = echo  # в скриптовом режиме выводить приглашение и текст команды
+        # Весь вывод идет через приемник: терминал, память (MemorySink) или файл (FileSink)
+        self.out = output if output is not None else TerminalSink()
+        self._prompt_path = None
+        self._prompt = None
+
+        # Таблица команд: имя -> обработчик(args)
+        self.commands = {
+            "exit": self.exit_command,
+            "ls": self.ls_command,
+            "cd": self.cd_command,
+            "pwd": self.pwd_command,
+            "cat": self.cat_command,
+            "echo": self.echo_command,
+            "mkdir": self.mkdir_command,
+            "touch": self.touch_command,
+            "uname": self.uname_command,
+            "mv": self.mv_command,
+            "stats": self.stats_command,
+            "head": self.head_command,
+            "tail": self.tail_command,
+            "wc": self.wc_command,
+            "find": self.find_command,
+            "grep": self.grep_command,
+            "du": self.du_command,
+        }
+        # Потоковые версии команд для конвейера: (аргументы, строки предыдущей команды или None)
+        # -> итератор строк. Остальные команды в конвейере выполняются целиком с перехватом вывода
+        self.streams = {
+            "cat": self.cat_stream,
+            "head": self.head_stream,
+            "tail": self.tail_stream,
+            "wc": self.wc_stream,
+            "grep": self.grep_stream,
+        }
+        if self.stats:
+            self.stats.attach(self)
 
         if self.script_mode:
             self.load_script()
 
+    def _load_vfs(self, vfs_path, workers, journal, cache_bytes, raise_errors=False):
+        """Загружает VFS (в фоновом режиме — в отдельном потоке, ошибка сохраняется до обращения)"""
+        load_start = time.perf_counter()
+        try:
+            vfs = VirtualFileSystem(vfs_path, workers=workers, journal=journal, cache_bytes=cache_bytes)
+        except Exception as e:
+            if raise_errors:
+                raise
+            self._vfs_error = e
+            return
+        if self.stats:
+            self.stats.load_seconds = time.perf_counter() - load_start
+        self._vfs = vfs
+
+    @property
+    def vfs(self):
+        """Дерево VFS; при фоновой загрузке первое обращение ждет ее окончания"""
+        vfs = self._vfs
+        if vfs is None:
+            self._loader.join()
+            if self._vfs_error is not None:
+                # Без дерева работать дальше нельзя: сообщаем об ошибке и завершаем сеанс
+                if self.running:
+                    self.running = False
+                    self.out.line(f"Ошибка загрузки VFS: {self._vfs_error}")
+                raise RuntimeError(f"Ошибка загрузки VFS: {self._vfs_error}")
+            vfs = self._vfs
+        return vfs
+
+    def vfs_ready(self):
+        """Загружено ли дерево (обращение к нему не будет ждать)"""
+        return self._vfs is not None
+
+    def resolve_path(self, current_path, target_path):
+        """Разрешает путь в дереве; команды эмулятора ищут узлы только через этот метод
+        (его замеряет статистика, не трогая общую для сеансов VFS)"""
+        return self.vfs.resolve_path(current_path, target_path)
+
     def load_script(self):
         """Загружает скрипт из файла"""
         try:
             with open(self.script_path, 'r', encoding='utf-8') as f:
                 self.script_lines = [line.strip() for line in f if line.strip() and not line.strip().startswith('#')]
         except Exception as e:
-            print(f"Ошибка загрузки скрипта: {e}")
+            self.out.line(f"Ошибка загрузки скрипта: {e}")
+            self.out.flush()
             sys.exit(1)
 
     def get_prompt(self):
-        """Формирует приглашение к вводу"""
-        if self.current_path.startswith('/home/user'):
-            display_path = '~' + self.current_path[len('/home/user'):]
-        else:
-            display_path = self.current_path
+        """Формирует приглашение к вводу (пересобирается только после смены директории)"""
+        if self._prompt_path != self.current_path:
+            if self.current_path.startswith('/home/user'):
+                display_path = '~' + self.current_path[len('/home/user'):]
+            else:
+                display_path = self.current_path
 
-        return f"{self.username}@{self.hostname}:{display_path}$ "
+            self._prompt = f"{self.username}@{self.hostname}:{display_path}$ "
+            self._prompt_path = self.current_path
+        return self._prompt
 
     def parse_command(self, command_line):
         """Парсит командную строку с учетом кавычек"""
         try:
             return shlex.split(command_line)
         except ValueError as e:
-            print(f"Ошибка парсинга: {e}")
+            self.out.line(f"Ошибка парсинга: {e}")
             return None
 
+    def run_command(self, command_line):
+        """Разбирает и выполняет одну строку; для встраивания эмулятора в другой код"""
+        command = compile_line(command_line, self.commands)
+        if command.error is not None:
+            self.out.line(f"Ошибка парсинга: {command.error}")
+            return True
+        return self.execute_compiled(command)
+
+    def execute_compiled(self, command):
+        """Выполняет разобранную строку (простую команду или конвейер)"""
+        if command.name is None:
+            return True
+        if command.stages is not None:
+            return self.dispatch("pipeline", self.pipeline_command, command)
+        return self.dispatch(command.name, command.handler, command.args)
+
     def execute_command(self, command_parts):
         """Выполняет команду с остановкой при ошибке в скриптовом режиме"""
         if not command_parts:
             return True
 
         command = command_parts[0]
-        args = command_parts[1:]
+        return self.dispatch(command, self.commands.get(command), command_parts[1:])
 
+    def dispatch(self, command, handler, args):
+        """Вызывает обработчик команды; возвращает False, если работу нужно завершить"""
         try:
-            if command == "exit":
-                self.running = False
-                print("Выход из эмулятора")
-                return False
-
-            elif command == "ls":
-                self.ls_command(args)
-
-            elif command == "cd":
-                self.cd_command(args)
-
-            elif command == "pwd":
-                print(self.current_path)
-
-            elif command == "cat":
-                self.cat_command(args)
-
-            elif command == "echo":
-                self.echo_command(args)
-
-            elif command == "mkdir":
-                self.mkdir_command(args)
-
-            elif command == "touch":
-                self.touch_command(args)
-
-            elif command == "uname":
-                self.uname_command(args)
-
-            elif command == "mv":
-                self.mv_command(args)
-
-            else:
-                print(f"{command}: команда не найдена")
-                if self.script_mode:
-                    raise RuntimeError(f"Неизвестная команда: {command}")
-
-            return True
+            self.call_handler(command, handler, args)
+            return self.running
 
         except Exception as e:
             if self.script_mode:
-                print(f"Ошибка в скрипте: {e}")
+                self.out.line(f"Ошибка в скрипте: {e}")
                 raise  # Пробрасываем ошибку выше для остановки скрипта
             return True
 
-    def ls_command(self, args):
-        """Команда ls"""
-        target_path = self.current_path
-        if args:
-            target_path = args[0]
+    def call_handler(self, command, handler, args):
+        """Вызывает обработчик; ошибки пробрасываются в dispatch"""
+        if handler is None:
+            self.unknown_command(command)
+        else:
+            handler(args)
 
-        node = self.vfs.resolve_path(self.current_path, target_path)
+    def unknown_command(self, command):
+        """Сообщение о неизвестной команде"""
+        self.out.line(f"{command}: команда не найдена")
+        if self.script_mode:
+            raise RuntimeError(f"Неизвестная команда: {command}")
+
+    def exit_command(self, args):
+        """Команда exit"""
+        self.running = False
+        self.out.line("Выход из эмулятора")
+
+    def pwd_command(self, args):
+        """Команда pwd"""
+        self.out.line(self.current_path)
+
+    def ls_command(self, args):
+        """Команда ls [-l] [--limit=N] [--offset=N] [--prefix=P] [путь].
+
+        -l добавляет тип и размер (у директорий — суммарный размер поддерева). Записи берутся
+        срезом из индекса имен директории, без сортировки всех детей; префикс можно задать
+        и звездочкой в конце пути: ls /var/log/sys*.
+        """
+        long_format = False
+        limit = None
+        offset = 0
+        prefix = None
+        paths = []
+        for arg in args:
+            if arg == "-l":
+                long_format = True
+            elif arg.startswith("--limit="):
+                limit = self._option_number("ls", arg)
+            elif arg.startswith("--offset="):
+                offset = self._option_number("ls", arg)
+            elif arg.startswith("--prefix="):
+                prefix = arg[len("--prefix="):]
+            else:
+                paths.append(arg)
+        target_path = paths[0] if paths else self.current_path
+
+        node = self.resolve_path(self.current_path, target_path)
+        if node is None and prefix is None and target_path.endswith("*") \
+                and not any(char in target_path[:-1] for char in "*?["):
+            directory, _, prefix = target_path[:-1].rpartition("/")
+            node = self.resolve_path(self.current_path, directory or ("/" if "/" in target_path else "."))
         if not node:
             raise RuntimeError(f"Нет доступа к '{target_path}': Нет такого файла или каталога")
 
-        if node['type'] != 'directory':
+        if not node.is_dir:
             raise RuntimeError(f"'{target_path}': Не директория")
 
-        files = list(node['content'].keys())
-        for file in sorted(files):
-            file_type = node['content'][file]['type']
-            indicator = '/' if file_type == 'directory' else ''
-            print(f"{file}{indicator}")
+        children = node.children
+        for name in node.list_names(prefix or "", offset, limit):
+            child = children[name]
+            indicator = '/' if child.is_dir else ''
+            if long_format:
+                size = child.totals()[0] if child.is_dir else child.size()
+                self.out.line(f"{'d' if child.is_dir else '-'} {size:>10} {name}{indicator}")
+            else:
+                self.out.line(f"{name}{indicator}")
+
+    @staticmethod
+    def _option_number(command, arg):
+        """Неотрицательное число из параметра вида --имя=N"""
+        option, _, value = arg.partition("=")
+        try:
+            number = int(value)
+        except ValueError:
+            number = -1
+        if number < 0:
+            raise RuntimeError(f"{command}: неверное значение {option}: '{value}'")
+        return number
+
+    def du_command(self, args):
+        """Команда du [-s] [-h] [путь...]: размер поддеревьев в байтах по агрегатам директорий.
+
+        Без -s, как в UNIX, выводится каждая поддиректория (после своих детей).
+        """
+        flags = "".join(arg[1:] for arg in args if arg.startswith("-") and len(arg) > 1)
+        paths = [arg for arg in args if not (arg.startswith("-") and len(arg) > 1)] or ["."]
+        unknown = set(flags) - set("sh")
+        if unknown:
+            raise RuntimeError(f"du: неизвестный параметр -{''.join(sorted(unknown))}")
+        summarize = "s" in flags
+        fmt = self._human_size if "h" in flags else str
+
+        for path in paths:
+            node = self.resolve_path(self.current_path, path)
+            if node is None:
+                raise RuntimeError(f"du: невозможно получить доступ к '{path}': Нет такого файла или каталога")
+            size = self.vfs.node_usage(node)[0]
+            if not summarize and node.is_dir:
+                self._du_subdirectories(path.rstrip("/") or "/", node, fmt)
+            self.out.line(f"{fmt(size)}\t{path}")
+
+    def _du_subdirectories(self, path, node, fmt):
+        """Выводит поддиректории node в обратном порядке обхода (дети раньше родителя)"""
+        prefix = "" if path == "/" else path
+        stack = [(prefix, node, False)]
+        while stack:
+            current, directory, ready = stack.pop()
+            if ready:
+                if directory is not node:
+                    self.out.line(f"{fmt(directory.totals()[0])}\t{current}")
+                continue
+            stack.append((current, directory, True))
+            for name in sorted(directory.children, reverse=True):
+                child = directory.children[name]
+                if child.is_dir:
+                    stack.append((f"{current}/{name}", child, False))
+
+    @staticmethod
+    def _human_size(size):
+        """Размер в формате du -h: 512, 1.5K, 12M"""
+        for unit in ("", "K", "M", "G", "T"):
+            if size < 1024 or unit == "T":
+                break
+            size /= 1024
+        if not unit:
+            return str(size)
+        return f"{size:.1f}{unit}" if size < 10 else f"{size:.0f}{unit}"
 
     def cd_command(self, args):
         """Команда cd"""
@@ -131,87 +354,295 @@ class ShellEmulator:
             raise RuntimeError("Слишком много аргументов")
 
         target_path = args[0]
-        new_node = self.vfs.resolve_path(self.current_path, target_path)
+        new_node = self.resolve_path(self.current_path, target_path)
 
         if not new_node:
             raise RuntimeError(f"'{target_path}': Нет такой директории")
 
-        if new_node['type'] != 'directory':
+        if not new_node.is_dir:
             raise RuntimeError(f"'{target_path}': Не директория")
 
         # Обновляем путь
-        if target_path.startswith('/'):
-            self.current_path = target_path
-        else:
-            if self.current_path == '/':
-                self.current_path = '/' + target_path
-            else:
-                self.current_path = self.current_path + '/' + target_path
-
-        self.normalize_path()
+        self.current_path = normalize_path(self.current_path, target_path)
 
     def cat_command(self, args):
         """Команда cat"""
         if not args:
-            print("Отсутствуют аргументы")
+            self.out.line("Отсутствуют аргументы")
             return
 
         for file_path in args:
-            content = self.vfs.get_file_content(self.current_path, file_path)
-            if content is None:
-                print(f"Файл '{file_path}' не существует")
+            node = self.vfs.file_node(self.resolve_path(self.current_path, file_path))
+            if node is None:
+                self.out.line(f"Файл '{file_path}' не существует")
+            else:
+                # Содержимое идет в вывод кусками, не собираясь в одну строку
+                for text in node.iter_text():
+                    self.out.write(text)
+                self.out.line()
+
+    def cat_stream(self, args, lines):
+        """cat в конвейере: строки файлов или, без аргументов, входные строки"""
+        if not args:
+            if lines is None:
+                yield "Отсутствуют аргументы"
+            else:
+                yield from lines
+            return
+        for file_path in args:
+            node = self.vfs.file_node(self.resolve_path(self.current_path, file_path))
+            if node is None:
+                yield f"Файл '{file_path}' не существует"
+            else:
+                yield from node.iter_lines()
+
+    def head_command(self, args):
+        """Команда head: первые строки файлов (по умолчанию 10)"""
+        for line in self.head_stream(args, None):
+            self.out.line(line)
+
+    def tail_command(self, args):
+        """Команда tail: последние строки файлов (по умолчанию 10)"""
+        for line in self.tail_stream(args, None):
+            self.out.line(line)
+
+    def head_stream(self, args, lines):
+        """head в конвейере: после count строк источник больше не читается"""
+        return self._lines_stream("head", args, lines, lambda node, count: node.head(count),
+                                  lambda source, count: itertools.islice(source, max(count, 0)))
+
+    def tail_stream(self, args, lines):
+        """tail в конвейере: в памяти держатся только последние count строк"""
+        return self._lines_stream("tail", args, lines, lambda node, count: node.tail(count),
+                                  lambda source, count: deque(source, maxlen=count) if count > 0 else ())
+
+    def _lines_stream(self, name, args, lines, take, take_input):
+        """Общая часть head и tail: разбор -n N (или -nN) и строки файлов с заголовками"""
+        count = 10
+        files = []
+        args = list(args)
+        while args:
+            arg = args.pop(0)
+            if arg == "-n" or (arg.startswith("-n") and len(arg) > 2):
+                value = arg[2:] or (args.pop(0) if args else "")
+                try:
+                    count = int(value)
+                except ValueError:
+                    raise RuntimeError(f"{name}: неверное число строк: '{value}'")
             else:
-                print(content)
+                files.append(arg)
+        if not files:
+            if lines is None:
+                raise RuntimeError(f"{name}: отсутствуют аргументы")
+            yield from take_input(lines, count)
+            return
+
+        for i, file_path in enumerate(files):
+            node = self.vfs.file_node(self.resolve_path(self.current_path, file_path))
+            if node is None:
+                yield f"Файл '{file_path}' не существует"
+                continue
+            if len(files) > 1:
+                if i:
+                    yield ""
+                yield f"==> {file_path} <=="
+            yield from take(node, count)
+
+    def wc_command(self, args):
+        """Команда wc: строки, слова и байты файлов (-l, -w, -c выбирают счетчики)"""
+        for line in self.wc_stream(args, None):
+            self.out.line(line)
+
+    def wc_stream(self, args, lines):
+        """wc в конвейере: без файлов считает входные строки"""
+        flags = [arg for arg in args if arg.startswith("-") and len(arg) > 1]
+        files = [arg for arg in args if not (arg.startswith("-") and len(arg) > 1)]
+        selected = "".join(flag[1:] for flag in flags)
+        unknown = set(selected) - set("lwc")
+        if unknown:
+            raise RuntimeError(f"wc: неизвестный параметр -{''.join(sorted(unknown))}")
+        columns = [i for i, flag in enumerate("lwc") if flag in selected] or [0, 1, 2]
+        if not files:
+            if lines is None:
+                raise RuntimeError("wc: отсутствуют аргументы")
+            values = [0, 0, 0]
+            for line in lines:
+                values[0] += 1
+                values[1] += len(line.split())
+                values[2] += len(line.encode("utf-8")) + 1
+            yield " ".join(f"{values[i]:>7}" for i in columns)
+            return
+
+        totals = [0, 0, 0]
+        for file_path in files:
+            node = self.vfs.file_node(self.resolve_path(self.current_path, file_path))
+            if node is None:
+                yield f"Файл '{file_path}' не существует"
+                continue
+            line_count, words, _, size = node.counts()
+            values = (line_count, words, size)
+            totals = [total + value for total, value in zip(totals, values)]
+            yield " ".join(f"{values[i]:>7}" for i in columns) + f" {file_path}"
+        if len(files) > 1:
+            yield " ".join(f"{totals[i]:>7}" for i in columns) + " итого"
 
     def echo_command(self, args):
         """Команда echo"""
-        print(' '.join(args))
+        self.out.line(' '.join(args))
 
     def mkdir_command(self, args):
-        """Команда mkdir (заглушка)"""
-        if not args:
+        """Команда mkdir [-p] <директория>..."""
+        parents = "-p" in args
+        paths = [arg for arg in args if arg != "-p"]
+        if not paths:
             raise RuntimeError("Отсутствуют аргументы")
-        print(f"mkdir: создание директорий {args} (в памяти VFS)")
+        for path in paths:
+            self.vfs.make_directory(self.current_path, path, parents=parents)
 
     def touch_command(self, args):
-        """Команда touch (заглушка)"""
+        """Команда touch <файл>..."""
         if not args:
             raise RuntimeError("Отсутствуют аргументы")
-        print(f"touch: создание файлов {args} (в памяти VFS)")
+        for path in args:
+            self.vfs.create_file(self.current_path, path)
 
     def uname_command(self, args):
         """Команда uname"""
         # Обработка флагов
-        sysname = platform.system()
+        sysname = self.host.system
         nodename = self.hostname
-        release = platform.release()
-        version = platform.version()
-        machine = platform.machine()
+        release = self.host.release
+        version = self.host.version
+        machine = self.host.machine
 
         if not args:
             # Если нет флагов - выводим только имя системы
-            print(sysname)
+            self.out.line(sysname)
             return
 
         for arg in args:
             if arg == "-a":
                 # Все поля
-                print(f"{sysname} {nodename} {release} {version} {machine}")
+                self.out.line(f"{sysname} {nodename} {release} {version} {machine}")
             elif arg == "-s":
-                print(sysname)
+                self.out.line(sysname)
             elif arg == "-n":
-                print(nodename)
+                self.out.line(nodename)
             elif arg == "-r":
-                print(release)
+                self.out.line(release)
             elif arg == "-v":
-                print(version)
+                self.out.line(version)
             elif arg == "-m":
-                print(machine)
+                self.out.line(machine)
             else:
-                print(f"uname: неподдерживаемый флаг: {arg}")
+                self.out.line(f"uname: неподдерживаемый флаг: {arg}")
                 if self.script_mode:
                     raise RuntimeError(f"Неподдерживаемый флаг: {arg}")
 
+    def find_command(self, args):
+        """Команда find: find <путь> [-name <шаблон>] — поиск по индексу имен"""
+        if not args:
+            raise RuntimeError("find: отсутствуют аргументы")
+        path = args[0]
+        if len(args) == 1:
+            pattern = "*"
+        elif len(args) == 3 and args[1] == "-name":
+            pattern = args[2]
+        else:
+            raise RuntimeError("find: использование: find <путь> [-name <шаблон>]")
+
+        start = normalize_path(self.current_path, path)
+        for found in self.vfs.find(self.current_path, path, pattern):
+            self.out.line(self._display_path(path, start, found))
+
+    def grep_command(self, args):
+        """Команда grep: grep [-r] [-i] <шаблон> <путь>... — поиск строк по регулярному выражению"""
+        for line in self.grep_stream(args, None):
+            self.out.line(line)
+
+    def grep_stream(self, args, lines):
+        """grep в конвейере: без путей фильтрует входные строки"""
+        recursive = ignore_case = False
+        args = list(args)
+        while args and args[0].startswith("-") and len(args[0]) > 1:
+            flags = args.pop(0)[1:]
+            unknown = set(flags) - set("ri")
+            if unknown:
+                raise RuntimeError(f"grep: неизвестный параметр -{''.join(sorted(unknown))}")
+            recursive = recursive or "r" in flags
+            ignore_case = ignore_case or "i" in flags
+        if len(args) < (1 if lines is not None else 2):
+            raise RuntimeError("grep: использование: grep [-r] [-i] <шаблон> <путь>...")
+
+        pattern, paths = args[0], args[1:]
+        try:
+            regex = re.compile(pattern, re.IGNORECASE if ignore_case else 0)
+        except re.error as e:
+            raise RuntimeError(f"grep: неверное регулярное выражение: {e}")
+
+        if not paths:
+            search = regex.search
+            yield from (line for line in lines if search(line))
+            return
+
+        show_names = recursive or len(paths) > 1
+        for path in paths:
+            node = self.resolve_path(self.current_path, path)
+            if node is None:
+                yield f"grep: {path}: Нет такого файла или каталога"
+                continue
+            if node.is_dir and not recursive:
+                yield f"grep: {path}: Это директория"
+                continue
+            start = normalize_path(self.current_path, path)
+            for found, node in self.vfs.grep_files(self.current_path, path, pattern):
+                prefix = self._display_path(path, start, found) + ":" if show_names else ""
+                for line in self.vfs.file_node(node).iter_lines():
+                    if regex.search(line):
+                        yield prefix + line
+
+    @staticmethod
+    def _display_path(path, start, found):
+        """Показывает найденный абсолютный путь относительно аргумента, как его ввел пользователь"""
+        base = path.rstrip("/")
+        if start == "/":
+            return base + found if found != "/" else path
+        return base + found[len(start):]
+
+    def pipeline_command(self, command):
+        """Выполняет конвейер: команды связаны генераторами, строки передаются по одной.
+
+        Поэтому `cat big.log | grep ERROR | head -n 10` перестает читать файл после десятой
+        найденной строки, а перенаправление пишет вывод в файл VFS блоками, не собирая его целиком.
+        """
+        lines = None
+        for stage in command.stages:
+            if stage.handler is None:
+                self.unknown_command(stage.name)
+                return
+            stream = self.streams.get(stage.name)
+            lines = stream(stage.args, lines) if stream else self._captured(stage)
+
+        if command.redirect is None:
+            for line in lines:
+                self.out.line(line)
+        else:
+            path, append = command.redirect
+            self.vfs.write_lines(self.current_path, path, lines, append)
+
+    def _captured(self, stage):
+        """Выполняет команду без потоковой версии целиком и отдает ее вывод построчно"""
+        out = self.out
+        self.out = MemorySink()
+        try:
+            self.call_handler(stage.name, stage.handler, stage.args)
+            output = self.out.getvalue()
+        finally:
+            self.out = out
+        lines = output.split("\n")
+        lines.pop()  # после последней строки вывода всегда стоит перевод строки
+        yield from lines
+
     def mv_command(self, args):
         """Команда mv"""
         if len(args) != 2:
@@ -222,81 +653,147 @@ class ShellEmulator:
 
         self.vfs.move_node(self.current_path, source, dest)
 
+    def stats_command(self, args):
+        """Команда stats: счетчики и задержки команд, время resolve_path и загрузки, размер дерева
+        и счетчики кэша содержимого"""
+        if not self.stats:
+            self.out.line("stats: статистика отключена (запустите эмулятор с --stats)")
+            return
+        unknown = [arg for arg in args if arg not in ("--json", "--full")]
+        if unknown:
+            raise RuntimeError(f"stats: неизвестный параметр {unknown[0]}")
+        # --full: объем памяти дерева обходом всех узлов (раскрывает весь снимок)
+        full = "--full" in args
+        if "--json" in args:
+            self.out.line(self.stats.to_json(self.vfs, full))
+            return
+        for line in self.stats.format_lines(self.vfs, full):
+            self.out.line(line)
+
     def normalize_path(self):
         """Нормализует путь"""
-        # Разбиваем путь на части
-        parts = self.current_path.split('/')
-        stack = []
-        for part in parts:
-            if part == '..':
-                if stack and stack[-1] != '..':
-                    stack.pop()
-            elif part and part != '.':
-                stack.append(part)
-
-        # Собираем нормализованный путь
-        if not stack:
-            self.current_path = '/'
-        else:
-            self.current_path = '/' + '/'.join(stack)
+        self.current_path = normalize_path(self.current_path, '.')
 
     def run_script_mode(self):
         """Режим выполнения скрипта с остановкой при ошибках"""
-        # Проверяем и выводим motd
-        motd = self.vfs.get_motd()
-        if motd:
-            print(motd)
+        try:
+            # Проверяем и выводим motd
+            self.show_motd()
 
-        for i, line in enumerate(self.script_lines, 1):
-            prompt = self.get_prompt()
-            print(f"{prompt}{line}")
+            # Скрипт разбирается целиком один раз, дальше — только вызовы обработчиков
+            program = compile_script(self.script_lines, self.commands)
+            for command in program:
+                if self.echo:
+                    self.out.line(f"{self.get_prompt()}{command.line}")
 
-            command_parts = self.parse_command(line)
-            if command_parts is None:
-                raise RuntimeError("Синтаксическая ошибка в команде")
+                if command.error is not None:
+                    self.out.line(f"Ошибка парсинга: {command.error}")
+                    raise RuntimeError("Синтаксическая ошибка в команде")
 
-            should_continue = self.execute_command(command_parts)
-            if not should_continue:
-                return True  # Нормальное завершение по exit
-            print()  # Пустая строка для читаемости
+                if not self.execute_compiled(command):
+                    return True  # Нормальное завершение по exit
+                if self.echo:
+                    self.out.line()  # Пустая строка для читаемости
 
-        return True
+            return True
+        finally:
+            self.out.flush()
 
     def run_interactive_mode(self):
         """Интерактивный режим"""
-        # Проверяем и выводим motd
-        motd = self.vfs.get_motd()
-        if motd:
-            print(motd)
+        # motd выводится до приветствия, если дерево уже загружено; иначе — перед выводом
+        # первой команды, к началу которой загрузка закончится
+        motd_pending = True
+        if self._loader is not None:
+            self._loader.join(self.MOTD_WAIT)
+        if self.vfs_ready():
+            self.show_motd()
+            motd_pending = False
 
         self.terminal_start()
+        if sys.stdin.isatty():
+            self.enable_completion()
 
         while self.running:
             try:
+                # Перед ожиданием ввода весь накопленный вывод должен быть на экране
+                self.out.flush()
                 command_line = input(self.get_prompt()).strip()
                 if not command_line:
                     continue
 
-                command_parts = self.parse_command(command_line)
-                if command_parts is None:
+                if motd_pending and self.vfs_ready():
+                    self.show_motd()
+                    motd_pending = False
+
+                command = compile_line(command_line, self.commands)
+                if command.error is not None:
+                    self.out.line(f"Ошибка парсинга: {command.error}")
                     continue
 
-                self.execute_command(command_parts)
-                print()
+                self.execute_compiled(command)
+                self.out.line()
 
             except KeyboardInterrupt:
-                print("\nДля выхода введите 'exit'")
+                self.out.line("\nДля выхода введите 'exit'")
             except EOFError:
-                print("\nВыход из эмулятора")
+                self.out.line("\nВыход из эмулятора")
                 break
             except Exception as e:
-                print(f"Ошибка: {e}")
+                self.out.line(f"Ошибка: {e}")
+
+        self.out.flush()
+
+    def completions(self, line, begidx, endidx):
+        """Варианты дополнения слова line[begidx:endidx]: команды для первого слова, иначе пути VFS.
+
+        Имена берутся срезом из индекса директории; пока дерево грузится в фоне, пути не дополняются.
+        """
+        text = line[begidx:endidx]
+        if not line[:begidx].strip() or line[:begidx].rstrip().endswith("|"):
+            return sorted(name for name in self.commands if name.startswith(text))
+        if not self.vfs_ready():
+            return []
+        directory, slash, prefix = text.rpartition("/")
+        node = self.resolve_path(self.current_path, directory or ("/" if slash else "."))
+        if node is None or not node.is_dir:
+            return []
+        children = node.children
+        return [f"{directory}{slash}{name}{'/' if children[name].is_dir else ''}"
+                for name in node.list_names(prefix, 0, self.COMPLETION_LIMIT)]
+
+    def enable_completion(self):
+        """Включает дополнение по Tab через readline (где его нет, например в Windows, — без него)"""
+        try:
+            import readline
+        except ImportError:
+            return
+        matches = []
+
+        def complete(text, state):
+            if state == 0:
+                matches[:] = self.completions(readline.get_line_buffer(), readline.get_begidx(),
+                                              readline.get_endidx())
+            return matches[state] if state < len(matches) else None
+
+        readline.set_completer_delims(" \t\n|>")
+        readline.set_completer(complete)
+        if "libedit" in (readline.__doc__ or ""):
+            readline.parse_and_bind("bind ^I rl_complete")
+        else:
+            readline.parse_and_bind("tab: complete")
+
+    def show_motd(self):
+        """Выводит сообщение дня, если оно есть в VFS"""
+        motd = self.vfs.get_motd()
+        if motd:
+            self.out.line(motd)
 
     def terminal_start(self):
         """Приветственное сообщение"""
         welcome_text = (
                 "Добро пожаловать в эмулятор командной строки с VFS\n"
-                "Доступные команды: ls, cd, pwd, cat, echo, mkdir, touch, exit, uname, mv\n"
+                "Доступные команды: ls, cd, pwd, cat, head, tail, wc, find, grep, du, echo, mkdir, touch, exit, uname, mv, stats\n"
                 "Виртуальная файловая система содержит:\n"
                 "  /home/user/documents/ - файлы документов\n"
                 "  /home/user/pictures/ - изображения\n"
@@ -305,7 +802,7 @@ class ShellEmulator:
                 "Для выхода введите 'exit'\n"
                 + "-" * 50
         )
-        print(welcome_text)
+        self.out.line(welcome_text)
 
     def run(self):
         """Основной метод запуска"""
@@ -313,4 +810,4 @@ class ShellEmulator:
             return self.run_script_mode()
         else:
             self.run_interactive_mode()
-            return True
\ No newline at end of file
+            return self._vfs_error is None
\ No newline at end of file
@@ -0,0 +1,137 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from ShellEmulator import ShellEmulator
+from OutputSink import MemorySink
+from ScriptCompiler import compile_line
+
+
+class RWLock:
+    """Блокировка читатели-писатель с приоритетом писателя"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    def acquire_read(self):
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._cond:
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+
+    def release_write(self):
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+
+class ShellServer:
+    """Сервер сеансов эмулятора поверх одной общей VFS.
+
+    У каждого подключения свой ShellEmulator (текущая директория, приглашение, вывод),
+    дерево VFS общее. Команды выполняются в пуле потоков: читающие — параллельно,
+    изменяющие (ShellEmulator.MUTATING_COMMANDS и перенаправление в файл) — монопольно под RWLock.
+    """
+
+    def __init__(self, vfs, threads=8):
+        self.vfs = vfs
+        self.lock = RWLock()
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+        self.sessions = 0
+
+    def execute(self, shell, command_line):
+        """Выполняет строку в сеансе (в потоке пула) и возвращает ее вывод"""
+        command = compile_line(command_line, shell.commands)
+        if command.error is not None:
+            shell.out.line(f"Ошибка парсинга: {command.error}")
+        elif command.name is not None:
+            # Перенаправление в файл тоже меняет дерево
+            mutating = command.is_mutating(shell.MUTATING_COMMANDS)
+            if mutating:
+                self.lock.acquire_write()
+            else:
+                self.lock.acquire_read()
+            try:
+                shell.execute_compiled(command)
+            finally:
+                if mutating:
+                    self.lock.release_write()
+                else:
+                    self.lock.release_read()
+            shell.out.line()
+
+        output = shell.out.getvalue()
+        shell.out.clear()
+        return output
+
+    async def handle(self, reader, writer):
+        """Обслуживает одно подключение"""
+        loop = asyncio.get_running_loop()
+        shell = ShellEmulator(self.vfs, output=MemorySink())
+        self.sessions += 1
+        try:
+            motd = self.vfs.get_motd()
+            if motd:
+                writer.write(f"{motd}\n".encode("utf-8"))
+
+            while shell.running:
+                writer.write(shell.get_prompt().encode("utf-8"))
+                await writer.drain()
+
+                data = await reader.readline()
+                if not data:
+                    break
+                command_line = data.decode("utf-8", "replace").strip()
+                if not command_line:
+                    continue
+
+                output = await loop.run_in_executor(self.executor, self.execute, shell, command_line)
+                writer.write(output.encode("utf-8"))
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.sessions -= 1
+            writer.close()
+
+    async def serve(self, address):
+        """Слушает адрес 'host:port' или 'unix:/путь/к/сокету' до остановки процесса"""
+        if address.startswith("unix:"):
+            path = address[len("unix:"):]
+            if os.path.exists(path):
+                os.unlink(path)
+            server = await asyncio.start_unix_server(self.handle, path=path)
+        else:
+            host, _, port = address.rpartition(":")
+            server = await asyncio.start_server(self.handle, host or "127.0.0.1", int(port))
+
+        async with server:
+            await server.serve_forever()
+
+    def run(self, address):
+        """Запускает сервер; Ctrl+C останавливает его"""
+        print(f"Сервер эмулятора слушает {address}")
+        try:
+            asyncio.run(self.serve(address))
+        except KeyboardInterrupt:
+            print("\nСервер остановлен")
+        finally:
+            self.executor.shutdown(wait=False)
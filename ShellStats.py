@@ -0,0 +1,198 @@
+import json
+import math
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from VfsNode import Encoding
+
+
+class LatencyHistogram:
+    """Гистограмма задержек с логарифмическими корзинами (шаг ~19%): память не растет с числом вызовов"""
+    __slots__ = ("buckets", "count", "total", "max")
+
+    BASE = 2 ** 0.25
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        """Учитывает одно измерение"""
+        ns = seconds * 1e9
+        index = int(math.log(ns, self.BASE)) if ns >= 1 else 0
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q):
+        """Возвращает верхнюю границу корзины, в которую попадает q-й перцентиль (в секундах)"""
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(self.BASE ** (index + 1) / 1e9, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "total_ms": self.total * 1e3,
+            "p50_ms": self.percentile(50) * 1e3,
+            "p99_ms": self.percentile(99) * 1e3,
+            "max_ms": self.max * 1e3,
+        }
+
+
+class CommandStats:
+    """Счетчики одной команды"""
+    __slots__ = ("latency", "errors")
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.errors = 0
+
+
+class ShellStats:
+    """Необязательная инструментация эмулятора.
+
+    Подключается через attach(): обертки ставятся на экземпляр эмулятора, поэтому без
+    статистики код команд и resolve_path выполняется без лишних проверок.
+    """
+
+    def __init__(self):
+        self.commands = {}
+        self.resolve = LatencyHistogram()
+        self.load_seconds = 0.0
+
+    def attach(self, shell):
+        """Оборачивает вызов обработчиков команд и shell.resolve_path замерами времени.
+
+        Дерево для этого не нужно, так что фоновая загрузка VFS не прерывается; общая для
+        нескольких сеансов VFS не меняется. Повторный вызов для того же эмулятора ничего не делает.
+        """
+        if "call_handler" in vars(shell):
+            return
+        commands = self.commands
+        call_handler = shell.call_handler
+
+        def timed_call_handler(command, handler, args):
+            stats = commands.get(command)
+            if stats is None:
+                stats = commands[command] = CommandStats()
+            start = time.perf_counter()
+            try:
+                return call_handler(command, handler, args)
+            except Exception:
+                stats.errors += 1
+                raise
+            finally:
+                stats.latency.add(time.perf_counter() - start)
+
+        resolve = self.resolve
+        resolve_path = shell.resolve_path
+
+        def timed_resolve_path(current_path, target_path):
+            start = time.perf_counter()
+            try:
+                return resolve_path(current_path, target_path)
+            finally:
+                resolve.add(time.perf_counter() - start)
+
+        shell.call_handler = timed_call_handler
+        shell.resolve_path = timed_resolve_path
+
+    def tree_stats(self, vfs, full=False):
+        """Число узлов дерева и (при full=True) приблизительный объем занимаемой ими памяти.
+
+        Числа берутся из агрегатов корня — у снимка они считаются по таблице узлов, без раскрытия
+        директорий. Объем памяти требует обхода всего дерева (он раскрывает весь снимок),
+        поэтому считается только по явному запросу.
+        """
+        _, files, dirs = vfs.vfs.totals()
+        # Корень в агрегаты не входит
+        result = {"files": files, "directories": dirs + 1, "approx_bytes": None}
+        if full:
+            result["approx_bytes"] = self._tree_bytes(vfs.vfs)
+        return result
+
+    @staticmethod
+    def _tree_bytes(root):
+        """Приблизительный объем памяти узлов дерева (обход всех узлов)"""
+        size = 0
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            size += sys.getsizeof(node)
+            if node.is_dir:
+                size += sys.getsizeof(node.children)
+                stack.extend(node.children.values())
+            else:
+                data, encoding = node.state()
+                size += sys.getsizeof(data)
+                if encoding == Encoding.CHUNKS:
+                    size += sum(sys.getsizeof(chunk) for chunk in data)
+                elif encoding == Encoding.INVALID:
+                    size += sum(sys.getsizeof(part) for part in data[:2])
+        return size
+
+    def to_dict(self, vfs, full=False):
+        """Собирает всю статистику в словарь, пригодный для JSON"""
+        result = {
+            "load_ms": self.load_seconds * 1e3,
+            "commands": {},
+            "resolve_path": self.resolve.to_dict(),
+            "tree": self.tree_stats(vfs, full),
+        }
+        for name in sorted(self.commands):
+            stats = self.commands[name]
+            result["commands"][name] = dict(stats.latency.to_dict(), errors=stats.errors)
+        cache = vfs.cache_stats()
+        if cache is not None:
+            result["content_cache"] = cache
+        if resource is not None:
+            # ru_maxrss: КБ в Linux, байты в macOS
+            scale = 1 if sys.platform == "darwin" else 1024
+            result["max_rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+        return result
+
+    def to_json(self, vfs, full=False):
+        return json.dumps(self.to_dict(vfs, full), ensure_ascii=False, indent=2)
+
+    def format_lines(self, vfs, full=False):
+        """Строки для вывода командой stats"""
+        data = self.to_dict(vfs, full)
+        lines = [f"{'команда':<10} {'вызовы':>8} {'ошибки':>7} {'p50, мс':>9} {'p99, мс':>9}"]
+        for name, stats in data["commands"].items():
+            lines.append(f"{name:<10} {stats['count']:>8} {stats['errors']:>7} "
+                         f"{stats['p50_ms']:>9.3f} {stats['p99_ms']:>9.3f}")
+        resolve = data["resolve_path"]
+        lines.append(f"resolve_path: {resolve['count']} вызовов, всего {resolve['total_ms']:.3f} мс, "
+                     f"p50 {resolve['p50_ms']:.4f} мс, p99 {resolve['p99_ms']:.4f} мс")
+        lines.append(f"Загрузка VFS: {data['load_ms']:.1f} мс")
+        tree = data["tree"]
+        lines.append(f"Узлов: {tree['files'] + tree['directories']} "
+                     f"(файлов {tree['files']}, директорий {tree['directories']}), "
+                     + (f"~{tree['approx_bytes'] / 2 ** 20:.1f} МБ" if tree["approx_bytes"] is not None
+                        else "память дерева: stats --full"))
+        if "content_cache" in data:
+            cache = data["content_cache"]
+            lines.append(f"Кэш содержимого: {cache['resident_bytes'] / 2 ** 20:.1f} из "
+                         f"{cache['budget_bytes'] / 2 ** 20:.1f} МБ (файлов {cache['tracked_files']}), "
+                         f"попаданий {cache['hits']}, первых чтений {cache['first_loads']}, "
+                         f"промахов {cache['misses']}, вытеснений {cache['evictions']}, "
+                         f"на диске {cache['spill_bytes'] / 2 ** 20:.1f} МБ")
+        if "max_rss_bytes" in data:
+            lines.append(f"Пиковый RSS: {data['max_rss_bytes'] / 2 ** 20:.1f} МБ")
+        return lines
@@ -0,0 +1,253 @@
+import base64
+import binascii
+import json
+import os
+import sys
+import tarfile
+import time
+
+from VfsNode import DirectoryNode, FileNode, Encoding
+
+TAR_BLOCK = 512
+# Режимы записи tar (потоковые, "w|") по расширению; при чтении сжатие определяется по сигнатуре
+TAR_WRITE_MODES = (
+    ((".tar.gz", ".tgz"), "w|gz"),
+    ((".tar.bz2", ".tbz2"), "w|bz2"),
+    ((".tar.xz", ".txz"), "w|xz"),
+    ((".tar",), "w|"),
+)
+
+
+def _walk_image(root):
+    """Узлы дерева в порядке записи образа: (абсолютный путь, узел), директория раньше детей"""
+    stack = [("", root)]
+    while stack:
+        prefix, directory = stack.pop()
+        for name, node in directory.children.items():
+            path = f"{prefix}/{name}"
+            yield path, node
+            if node.is_dir:
+                stack.append((path, node))
+
+
+def file_chunks(node):
+    """Блоки байт содержимого файла: base64 декодируется, текст кодируется в UTF-8, байты — как есть"""
+    return _source_chunks(*node.source())
+
+
+def _source_chunks(data, encoding):
+    """Блоки байт содержимого в исходной форме (FileNode.source())"""
+    if encoding == Encoding.RAW:
+        return (data,)
+    if encoding == Encoding.CHUNKS:
+        return data
+    if encoding == Encoding.B64:
+        try:
+            return (base64.b64decode(data, validate=True),)
+        except (binascii.Error, ValueError):
+            # Байт у некорректного base64 нет: в tar он сохраняется тем, что покажет чтение
+            data = FileNode(data, Encoding.B64).read()
+    return (data.encode("utf-8"),)
+
+
+class _ChunkReader:
+    """Файлоподобное чтение из последовательности блоков — tarfile берет из него ровно size байт,
+    без склейки содержимого в один объект"""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._pending = memoryview(b"")
+
+    def read(self, size=-1):
+        parts = []
+        while size != 0:
+            if not self._pending:
+                chunk = next(self._chunks, None)
+                if chunk is None:
+                    break
+                self._pending = memoryview(chunk)
+            piece = self._pending if size < 0 else self._pending[:size]
+            parts.append(piece)
+            self._pending = self._pending[len(piece):]
+            if size > 0:
+                size -= len(piece)
+        return b"".join(parts)
+
+
+def _archive_parts(name):
+    """Части пути записи архива ('./etc/passwd', 'etc/') без '.'; '..' в пути не допускается"""
+    parts = [sys.intern(part) for part in name.split("/") if part and part != "."]
+    if ".." in parts:
+        raise RuntimeError(f"Недопустимый путь в архиве: '{name}'")
+    return parts
+
+
+def _open_stream(path):
+    """Открывает архив на чтение; сжатый (gzip, bz2, xz) распаковывается потоково"""
+    with open(path, "rb") as f:
+        magic = f.read(6)
+    if magic.startswith(b"\x1f\x8b"):
+        import gzip
+        return gzip.open(path, "rb")
+    if magic.startswith(b"BZh"):
+        import bz2
+        return bz2.open(path, "rb")
+    if magic == b"\xfd7zXZ\x00":
+        import lzma
+        return lzma.open(path, "rb")
+    return open(path, "rb")
+
+
+def _number(field):
+    """Число из поля заголовка tar: восьмеричная строка или base-256 (старший бит первого байта)"""
+    if field[0] & 0x80:
+        return int.from_bytes(field[1:], "big")
+    field = field.split(b"\0", 1)[0].strip()
+    return int(field, 8) if field else 0
+
+
+def _pax_records(data):
+    """Разбирает расширенный заголовок PAX: записи вида "<длина> <ключ>=<значение>\\n" """
+    records = {}
+    pos = 0
+    while pos < len(data) and data[pos:pos + 1] != b"\0":
+        space = data.index(b" ", pos)
+        end = pos + int(data[pos:space])
+        key, _, value = data[space + 1:end - 1].partition(b"=")
+        records[key.decode("utf-8")] = value.decode("utf-8", "replace")
+        pos = end
+    return records
+
+
+def _tar_entries(stream):
+    """Разбирает поток tar (ustar, PAX, длинные имена GNU): (имя, тип записи, содержимое).
+
+    В памяти одновременно только содержимое текущей записи. Заголовки разбираются срезами
+    напрямую — tarfile тратит на каждую запись в несколько раз больше, чем загрузка строки CSV.
+    """
+    pax = {}
+    long_name = None
+    while True:
+        header = stream.read(TAR_BLOCK)
+        if len(header) < TAR_BLOCK or not header.strip(b"\0"):
+            return  # нулевой блок — конец архива
+        try:
+            valid = _number(header[148:156]) == sum(header) - sum(header[148:156]) + 8 * ord(" ")
+            size = _number(header[124:136])
+        except ValueError:
+            valid = False
+        if not valid:
+            raise RuntimeError("Архив tar поврежден: неверный заголовок записи")
+        typeflag = header[156:157]
+        if "size" in pax and typeflag not in b"xgLK":
+            size = int(pax["size"])
+        data = stream.read(size)
+        if len(data) != size:
+            raise RuntimeError("Архив tar оборван")
+        stream.read(-size % TAR_BLOCK)
+
+        if typeflag == b"x":
+            pax = _pax_records(data)
+            continue
+        if typeflag == b"L":
+            long_name = data.rstrip(b"\0").decode("utf-8", "replace")
+            continue
+        if typeflag in (b"g", b"K"):
+            continue
+
+        name = pax.get("path") or long_name
+        if name is None:
+            name = header[:100].split(b"\0", 1)[0].decode("utf-8", "replace")
+            prefix = header[345:500].split(b"\0", 1)[0]
+            if header[257:262] == b"ustar" and prefix:
+                name = prefix.decode("utf-8", "replace") + "/" + name
+        pax = {}
+        long_name = None
+        yield name, typeflag, data
+
+
+def iter_tar(path):
+    """Читает tar (в том числе сжатый) запись за записью; возвращает пары (части пути, узел).
+
+    Содержимое файлов хранится байтами (Encoding.RAW) и декодируется при первом чтении.
+    Записи, отличные от файлов и директорий (ссылки, устройства), пропускаются.
+    """
+    with _open_stream(path) as stream:
+        for name, typeflag, data in _tar_entries(stream):
+            # Старые архивы помечают директории обычным типом и '/' в конце имени
+            if typeflag == b"5" or (typeflag in (b"0", b"\0") and name.endswith("/")):
+                yield _archive_parts(name), DirectoryNode()
+            elif typeflag in (b"0", b"\0", b"7"):
+                yield _archive_parts(name), FileNode(data, Encoding.RAW)
+
+
+def save_tar(root, path):
+    """Пишет дерево в tar потоково: содержимое каждого файла передается блоками без base64"""
+    mode = next(mode for suffixes, mode in TAR_WRITE_MODES if path.lower().endswith(suffixes))
+    # Целое время: дробное tarfile записал бы в отдельный PAX-заголовок у каждой записи
+    mtime = int(time.time())
+    tmp_path = path + ".tmp"
+    with tarfile.open(tmp_path, mode) as archive:
+        for node_path, node in _walk_image(root):
+            info = tarfile.TarInfo(node_path.lstrip("/"))
+            info.mtime = mtime
+            if node.is_dir:
+                info.type = tarfile.DIRTYPE
+                info.mode = 0o755
+                archive.addfile(info)
+            else:
+                chunks = file_chunks(node)
+                info.mode = 0o644
+                info.size = sum(len(chunk) for chunk in chunks)
+                archive.addfile(info, _ChunkReader(chunks))
+    os.replace(tmp_path, path)
+
+
+def iter_jsonl(path):
+    """Читает JSON Lines построчно; поля записи те же, что колонки CSV (path, type, content, content_b64)"""
+    from VirtualFileSystem import node_from_row
+
+    with open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                raise RuntimeError(f"Ошибка в строке {number} файла '{path}': {e}")
+            yield node_from_row(record)
+
+
+def save_jsonl(root, path):
+    """Пишет дерево в JSON Lines по записи на узел.
+
+    Текст хранится строкой как есть; base64 (content_b64) остается только для содержимого,
+    которое не является UTF-8 и не может быть строкой JSON. Некорректный base64 пишется
+    в content_b64 без изменений, как его хранит CSV.
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for node_path, node in _walk_image(root):
+            if node.is_dir:
+                record = {"path": node_path, "type": "directory"}
+            else:
+                record = _file_record(node_path, *node.source())
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    os.replace(tmp_path, path)
+
+
+def _file_record(node_path, data, encoding):
+    """Запись JSON Lines файла по содержимому в исходной форме"""
+    if encoding == Encoding.TEXT:
+        return {"path": node_path, "type": "file", "content": data}
+    if encoding == Encoding.B64:
+        try:
+            data = base64.b64decode(data, validate=True)
+        except (binascii.Error, ValueError):
+            return {"path": node_path, "type": "file", "content_b64": data}
+    else:
+        data = b"".join(_source_chunks(data, encoding))
+    try:
+        return {"path": node_path, "type": "file", "content": data.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"path": node_path, "type": "file", "content_b64": base64.b64encode(data).decode("ascii")}
@@ -0,0 +1,274 @@
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from VfsNode import CHUNK_SIZE, Encoding
+
+# Содержимое меньше этого размера отслеживается не по узлу, а страницами: отдельная запись
+# в LRU (~100 байт) была бы заметной долей самого содержимого
+MIN_TRACKED_BYTES = 4096
+# Сколько байт мелких файлов собирается в одну страницу — запись LRU
+PAGE_BYTES = 64 * 1024
+
+
+def resident_bytes(node):
+    """Сколько байт содержимого узла лежит в памяти процесса (срезы mmap снимка не считаются)"""
+    data, encoding = node.state()
+    if encoding == Encoding.INVALID:
+        # Текст ошибки мал, память занимают исходные байты
+        _, data, encoding = data
+    if encoding == Encoding.TEXT:
+        return len(data) if data.isascii() else len(data.encode("utf-8"))
+    if encoding == Encoding.B64:
+        return len(data)
+    if encoding == Encoding.RAW:
+        return len(data) if isinstance(data, bytes) else 0
+    if encoding == Encoding.CHUNKS:
+        return sum(len(chunk) for chunk in data if isinstance(chunk, bytes))
+    return 0
+
+
+class SpilledContent:
+    """Копия содержимого файла в файле подкачки: смещение, длина и исходная форма.
+
+    Содержимое узлов не меняется (запись создает новый узел), поэтому однажды записанная
+    копия остается верной и при повторном вытеснении файл заново не пишется.
+    """
+    __slots__ = ("cache", "file", "offset", "length", "encoding", "size")
+
+    def __init__(self, cache, file, offset, length, encoding, size):
+        self.cache = cache
+        self.file = file
+        self.offset = offset
+        self.length = length
+        self.encoding = encoding  # форма, в которой содержимое было вытеснено
+        self.size = size          # FileNode.size() содержимого — без чтения с диска
+
+    def load(self):
+        """Читает содержимое с диска: (данные, форма) в том виде, в каком его вытеснили"""
+        data = self.cache.read(self.file, self.offset, self.length)
+        if self.encoding == Encoding.TEXT:
+            return data.decode("utf-8"), Encoding.TEXT
+        if self.encoding == Encoding.B64:
+            return data.decode("ascii"), Encoding.B64
+        if self.encoding == Encoding.CHUNKS:
+            return tuple(data[i:i + CHUNK_SIZE] for i in range(0, len(data), CHUNK_SIZE)), Encoding.CHUNKS
+        return data, Encoding.RAW
+
+    def restored(self, node):
+        """Узел снова прочитал содержимое в память"""
+        self.cache.restored(node, self)
+
+
+class _SmallPage:
+    """Мелкие файлы, отслеживаемые одной записью LRU и вытесняемые вместе одной записью на диск.
+
+    Файлы попадают в открытую страницу в порядке загрузки (соседи по директории рядом)
+    или восстановления с диска. Узел не знает своей страницы, поэтому чтение мелкого файла
+    страницу не освежает: горячий файл после ее вытеснения вернется промахом в новую.
+    """
+    __slots__ = ("nodes", "spilled", "size")
+
+    def __init__(self):
+        self.nodes = []
+        self.spilled = []  # SpilledContent прошлого вытеснения узла или None
+        self.size = 0
+
+
+class VfsContentCache:
+    """Кэш содержимого файлов с ограничением памяти: LRU по узлам и вытеснение на диск.
+
+    Отслеживаются узлы с содержимым в памяти: от min_bytes — каждый своей записью, мелкие —
+    страницами по page_bytes. Когда их суммарный размер превышает budget байт, давно не читавшиеся
+    записи вытесняются: содержимое дописывается в файл подкачки (временный файл, удаляется при выходе),
+    а в узле остается SpilledContent. Следующее чтение (FileNode.materialize) берет его с диска
+    по смещению — это промах кэша. Первое чтение еще не декодированного содержимого считается
+    отдельно (first_loads): это не попадание, но и диск оно не трогает.
+
+    Место в файле подкачки не освобождается: копии перезаписанных файлов остаются в нем
+    до конца процесса.
+    """
+
+    def __init__(self, budget, min_bytes=MIN_TRACKED_BYTES, page_bytes=PAGE_BYTES):
+        self.budget = budget
+        self.min_bytes = min_bytes
+        self.page_bytes = page_bytes
+        self.hits = 0
+        self.first_loads = 0
+        self.misses = 0
+        self.evictions = 0
+        self.resident = 0
+        self.small_files = 0
+        self.pages = 0
+        # узел -> (размер в памяти, SpilledContent или None, форма при замере); _SmallPage -> None
+        self._lru = OrderedDict()
+        self._page = None  # открытая страница мелких файлов
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self._file = None
+        self._file_end = 0
+        self._pid = None
+
+    def admit(self, node, spilled=None):
+        """Начинает отслеживать узел с содержимым в памяти и вытесняет лишнее"""
+        encoding = node.state()[1]
+        size = resident_bytes(node)
+        with self._lock:
+            previous = self._lru.pop(node, None)
+            if previous is not None:
+                self.resident -= previous[0]
+                spilled = spilled or previous[1]
+            if size == 0:
+                return  # в памяти ничего нет: пустой файл или срезы mmap снимка
+            if size < self.min_bytes:
+                self._add_small(node, size, spilled)
+            else:
+                self._lru[node] = (size, spilled, encoding)
+                self.resident += size
+            self._evict()
+
+    def _add_small(self, node, size, spilled):
+        """Добавляет мелкий файл в открытую страницу; страница становится самой свежей"""
+        page = self._page
+        if page is None or page.size >= self.page_bytes:
+            page = self._page = _SmallPage()
+            self.pages += 1
+        page.nodes.append(node)
+        page.spilled.append(spilled)
+        page.size += size
+        self._lru[page] = None
+        self._lru.move_to_end(page)
+        self.resident += size
+        self.small_files += 1
+
+    def access(self, node):
+        """Отмечает чтение узла перед чтением содержимого. Содержимое в памяти — попадание
+        (узел становится самым свежим), вытесненное читается с диска — промах, еще не
+        декодированное декодируется здесь же — первое чтение"""
+        encoding = node.state()[1]
+        if encoding == Encoding.SPILLED:
+            node.materialize()
+            return
+        if encoding == Encoding.RAW or encoding == Encoding.B64:
+            counted = resident_bytes(node) > 0
+            node.materialize()
+            with self._lock:
+                self.first_loads += 1
+                tracked = node in self._lru
+            # Замеряется декодированное содержимое: у отслеживаемого узла оно сменило форму,
+            # а срез mmap до декодирования в памяти не лежал и нигде не учтен
+            if tracked or not counted:
+                self.admit(node)
+            return
+        with self._lock:
+            self.hits += 1
+            entry = self._lru.get(node)
+            if entry is not None and entry[2] == encoding:
+                self._lru.move_to_end(node)
+                return
+        if entry is None and resident_bytes(node) < self.min_bytes:
+            return  # мелкий файл учтен в своей странице
+        # Неотслеживаемый узел или содержимое сменило форму — размер замеряется заново
+        self.admit(node)
+
+    def restored(self, node, spilled):
+        """Содержимое вытесненного узла прочитано с диска"""
+        with self._lock:
+            self.misses += 1
+        self.admit(node, spilled)
+
+    def _evict(self):
+        """Вытесняет самые старые записи, пока занятая память больше бюджета (последняя остается)"""
+        while self.resident > self.budget and len(self._lru) > 1:
+            key, entry = self._lru.popitem(last=False)
+            if entry is None:
+                self._evict_page(key)
+                continue
+            size, spilled, _ = entry
+            self.resident -= size
+            if spilled is None:
+                payload, encoding, content_size = self._payload(key)
+                spilled = SpilledContent(self, *self._append(payload), encoding, content_size)
+            key.spill(spilled)
+            self.evictions += 1
+
+    def _evict_page(self, page):
+        """Вытесняет мелкие файлы страницы; еще не записанные пишутся в файл подкачки одним блоком"""
+        self.resident -= page.size
+        self.small_files -= len(page.nodes)
+        self.pages -= 1
+        if page is self._page:
+            self._page = None
+        pending = []
+        for node, spilled in zip(page.nodes, page.spilled):
+            if spilled is not None:
+                node.spill(spilled)
+                self.evictions += 1
+            elif node.state()[1] != Encoding.SPILLED:
+                # Уже вытесненный узел мог попасть и в другую запись — пишется один раз
+                pending.append((node, self._payload(node)))
+        if not pending:
+            return
+        file, offset, _ = self._append(b"".join(payload for _, (payload, _, _) in pending))
+        for node, (payload, encoding, size) in pending:
+            node.spill(SpilledContent(self, file, offset, len(payload), encoding, size))
+            offset += len(payload)
+            self.evictions += 1
+
+    def _payload(self, node):
+        """Содержимое узла для файла подкачки в его текущей форме: (байты, форма, размер)"""
+        data, encoding = node.state()
+        size = node.size()
+        if encoding == Encoding.INVALID:
+            # Пишутся исходные байты: после чтения с диска декодирование снова даст тот же текст ошибки
+            _, data, encoding = data
+        if encoding == Encoding.TEXT:
+            payload = data.encode("utf-8")
+        elif encoding == Encoding.B64:
+            payload = data.encode("ascii")
+        elif encoding == Encoding.CHUNKS:
+            payload = b"".join(data)
+        else:
+            payload = bytes(data)
+        return payload, encoding, size
+
+    def _append(self, payload):
+        """Дописывает байты в файл подкачки: (файл, смещение, длина)"""
+        with self._file_lock:
+            if self._pid != os.getpid():
+                # После fork (пакетный режим) процессы не должны писать в общий файл по одним смещениям:
+                # уже вытесненное читается из старого файла, новое пишется в свой
+                self._file = tempfile.TemporaryFile(prefix="vfs-spill-")
+                self._file_end = 0
+                self._pid = os.getpid()
+            offset = self._file_end
+            self._file.seek(offset)
+            self._file.write(payload)
+            self._file.flush()
+            self._file_end += len(payload)
+            return self._file, offset, len(payload)
+
+    def read(self, file, offset, length):
+        """Читает вытесненное содержимое по смещению"""
+        if hasattr(os, "pread"):
+            # Позиционное чтение не трогает общее смещение файла (важно после fork)
+            return os.pread(file.fileno(), length, offset)
+        with self._file_lock:
+            file.seek(offset)
+            return file.read(length)
+
+    def to_dict(self):
+        """Счетчики кэша для статистики"""
+        with self._lock:
+            return {
+                "budget_bytes": self.budget,
+                "resident_bytes": self.resident,
+                "tracked_files": len(self._lru) - self.pages + self.small_files,
+                "small_files": self.small_files,
+                "hits": self.hits,
+                "first_loads": self.first_loads,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "spill_bytes": self._file_end,
+            }
@@ -0,0 +1,56 @@
+import json
+import os
+
+
+class VfsJournal:
+    """Журнал изменений VFS: по одной JSON-записи на строку, только дозапись.
+
+    Записи: {"op": "mkdir", "path": ...}, {"op": "touch", "path": ...},
+    {"op": "mv", "src": ..., "dst": ...}, {"op": "write", "path": ..., "content": ..., "append": ...}.
+    Пути абсолютные и нормализованные, поэтому записи воспроизводятся без текущей директории.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def records(self):
+        """Читает записи журнала.
+
+        Оборванная последняя строка (сбой во время записи) отбрасывается и обрезается в файле,
+        чтобы следующие записи начинались с новой строки.
+        """
+        if not os.path.exists(self.path):
+            return
+        valid_size = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                valid_size += len(line)
+                yield json.loads(line)
+        if valid_size != os.path.getsize(self.path):
+            os.truncate(self.path, valid_size)
+
+    def append(self, record):
+        """Дописывает запись в конец журнала"""
+        if self.file is None:
+            self.file = open(self.path, "a", encoding="utf-8")
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.file.flush()
+
+    def size(self):
+        """Текущий размер журнала в байтах (записи дописываются со сбросом буфера)"""
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def truncate(self, size=0):
+        """Обрезает журнал до size байт: очищает после сжатия в новый базовый образ
+        или отбрасывает записи после checkpoint() при откате"""
+        self.close()
+        with open(self.path, "ab") as f:
+            f.truncate(size)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
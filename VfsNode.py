@@ -0,0 +1,413 @@
+import base64
+import binascii
+import bisect
+import codecs
+import itertools
+import threading
+from enum import IntEnum
+
+# Ленивые преобразования узлов (декодирование содержимого, раскрытие директорий снимка)
+# выполняются под этой блокировкой, чтобы параллельные читатели не получили разные копии
+LAZY_LOCK = threading.Lock()
+
+# Содержимое больше этого размера (в байтах UTF-8) хранится блоками, а не одной строкой
+CHUNK_SIZE = 64 * 1024
+
+
+class NodeType(IntEnum):
+    """Тип узла VFS"""
+    FILE = 0
+    DIRECTORY = 1
+
+
+class Encoding(IntEnum):
+    """Форма, в которой хранится содержимое файла до первого чтения"""
+    TEXT = 0  # уже декодированная строка
+    RAW = 1   # байты UTF-8 (например, срез mmap снимка)
+    B64 = 2   # строка base64 из CSV
+    CHUNKS = 3  # кортеж блоков байт UTF-8 (bytes или срезы memoryview) — для больших файлов
+    SPILLED = 4  # вытеснено кэшем содержимого на диск (SpilledContent из VfsContentCache)
+    INVALID = 5  # не UTF-8: (текст ошибки для чтения, исходные данные, их форма RAW или B64)
+
+
+class FileNode:
+    """Файл VFS. Тип хранится в классе, поэтому на узел приходится только два слота"""
+    __slots__ = ("data", "encoding")
+
+    kind = NodeType.FILE
+    is_dir = False
+    type = "file"
+
+    def __init__(self, data="", encoding=Encoding.TEXT):
+        self.data = data
+        self.encoding = encoding
+
+    @classmethod
+    def from_pieces(cls, pieces, base=None):
+        """Собирает файл из кусков текста, кодируя их в блоки по CHUNK_SIZE по мере поступления.
+
+        base — файл, к содержимому которого куски дописываются (его полные блоки не копируются).
+        Небольшое содержимое, как и раньше, хранится строкой.
+        """
+        chunks = []
+        pending = bytearray()
+        if base is not None:
+            data, encoding = base.content()
+            if encoding == Encoding.CHUNKS:
+                chunks.extend(data)
+                if len(chunks[-1]) < CHUNK_SIZE:
+                    # Неполный последний блок дописывается до CHUNK_SIZE, а не остается
+                    # мелким блоком перед каждым новым куском
+                    pending += chunks.pop()
+            else:
+                pending += data.encode("utf-8")
+        for piece in pieces:
+            pending += piece.encode("utf-8")
+            while len(pending) >= CHUNK_SIZE:
+                chunks.append(bytes(pending[:CHUNK_SIZE]))
+                del pending[:CHUNK_SIZE]
+        if not chunks:
+            return cls(pending.decode("utf-8"))
+        if pending:
+            chunks.append(bytes(pending))
+        return cls(tuple(chunks), Encoding.CHUNKS)
+
+    def read(self):
+        """Возвращает текст файла целиком.
+
+        Небольшое содержимое при первом обращении декодируется и кэшируется в узле строкой;
+        блочное склеивается при каждом вызове и в узле не копится — для него есть iter_text().
+        """
+        data, encoding = self.content()
+        if encoding == Encoding.CHUNKS:
+            return "".join(self.iter_text())
+        return data
+
+    def materialize(self):
+        """Приводит содержимое к итоговой форме: строке (TEXT) или блокам байт (CHUNKS).
+
+        base64 декодируется поблочно, без промежуточной копии всего файла; срезы mmap
+        остаются срезами. UTF-8 проверяется сразу, чтобы ошибка декодирования, как и раньше,
+        заменяла содержимое целиком, а не обрывала вывод на середине; исходные байты при этом
+        остаются в узле (Encoding.INVALID) для сохранения образа. Вытесненное на диск
+        содержимое читается обратно и снова попадает в кэш.
+        """
+        if self.encoding == Encoding.TEXT or self.encoding == Encoding.CHUNKS or self.encoding == Encoding.INVALID:
+            return
+        spilled = None
+        with LAZY_LOCK:
+            data, encoding = self.data, self.encoding
+            if encoding == Encoding.TEXT or encoding == Encoding.CHUNKS or encoding == Encoding.INVALID:
+                return
+            if encoding == Encoding.SPILLED:
+                spilled = data
+                data, encoding = spilled.load()
+            if encoding == Encoding.RAW or encoding == Encoding.B64:
+                data, encoding = _decode(data, encoding)
+            self.data = data
+            # Тип меняется после данных: увидевший итоговый тип читатель получит уже готовые данные
+            self.encoding = encoding
+        if spilled is not None:
+            spilled.restored(self)
+
+    def content(self):
+        """Итоговые данные и их форма (TEXT или CHUNKS) одним согласованным снимком.
+
+        Для содержимого не в UTF-8 это текст ошибки декодирования. Кэш содержимого может
+        вытеснить узел между materialize() и чтением данных — тогда содержимое
+        восстанавливается еще раз.
+        """
+        while True:
+            self.materialize()
+            data, encoding = self.state()
+            if encoding == Encoding.TEXT or encoding == Encoding.CHUNKS:
+                return data, encoding
+            if encoding == Encoding.INVALID:
+                return data[0], Encoding.TEXT
+
+    def state(self):
+        """Текущие (данные, форма) вместе: вытеснение меняет их под LAZY_LOCK"""
+        with LAZY_LOCK:
+            return self.data, self.encoding
+
+    def source(self):
+        """Содержимое в исходной форме для сохранения образа: вытесненное читается с диска,
+        но в памяти и в кэше не остается; для не-UTF-8 — исходные байты, а не текст ошибки"""
+        data, encoding = self.state()
+        if encoding == Encoding.SPILLED:
+            data, encoding = data.load()
+        if encoding == Encoding.INVALID:
+            return data[1], data[2]
+        return data, encoding
+
+    def spill(self, spilled):
+        """Заменяет содержимое в памяти ссылкой на его копию на диске (вызывается кэшем)"""
+        with LAZY_LOCK:
+            self.data = spilled
+            self.encoding = Encoding.SPILLED
+
+    def iter_text(self):
+        """Отдает текст файла кусками не больше CHUNK_SIZE, не собирая его целиком"""
+        data, encoding = self.content()
+        if encoding == Encoding.TEXT:
+            for i in range(0, len(data), CHUNK_SIZE):
+                yield data[i:i + CHUNK_SIZE]
+            return
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        for chunk in data:
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+
+    def iter_lines(self):
+        """Отдает строки файла по одной (без перевода строки), читая содержимое кусками"""
+        tail = ""
+        for text in self.iter_text():
+            lines = (tail + text).split("\n")
+            tail = lines.pop()
+            yield from lines
+        if tail:
+            yield tail
+
+    def head(self, count):
+        """Возвращает первые count строк, читая только нужные блоки"""
+        return list(itertools.islice(self.iter_lines(), max(count, 0)))
+
+    def tail(self, count):
+        """Возвращает последние count строк, читая блоки с конца.
+
+        Байт перевода строки не встречается внутри многобайтовых символов UTF-8,
+        поэтому блоки можно склеивать с конца и резать по нему без декодирования.
+        """
+        if count <= 0:
+            return []
+        data, encoding = self.content()
+        if encoding == Encoding.TEXT:
+            if not data:
+                return []
+            # Завершающий перевод строки не начинает новую строку
+            end = len(data) - 1 if data.endswith("\n") else len(data)
+            start = end
+            for _ in range(count):
+                start = data.rfind("\n", 0, start)
+                if start == -1:
+                    break
+            return data[start + 1:end].split("\n")
+
+        collected = []
+        newlines = 0
+        skip_last = data[-1][-1:] == b"\n"
+        for chunk in reversed(data):
+            chunk = bytes(chunk)
+            collected.append(chunk)
+            newlines += chunk.count(b"\n")
+            if newlines > count + skip_last:
+                break
+        blob = b"".join(reversed(collected))
+        if len(collected) < len(data):
+            # Первый из прочитанных блоков может начинаться посреди символа — отрезаем до перевода строки
+            blob = blob[blob.index(b"\n") + 1:]
+        lines = blob.decode("utf-8").split("\n")
+        if skip_last:
+            lines.pop()
+        return lines[-count:]
+
+    def size(self):
+        """Размер содержимого в байтах UTF-8 без декодирования.
+
+        Для base64 размер считается по длине строки; для некорректного base64 это лишь оценка.
+        Содержимое не в UTF-8 имеет размер исходных байт, а не текста ошибки.
+        """
+        # Без блокировки: size() зовется для каждого файла при загрузке. Если вытеснение
+        # или восстановление пришлось между чтениями полей, SpilledContent в паре с другой
+        # формой (или наоборот) дает TypeError/AttributeError — тогда пара читается под LAZY_LOCK
+        try:
+            return self._size(self.data, self.encoding)
+        except (TypeError, AttributeError):
+            return self._size(*self.state())
+
+    @staticmethod
+    def _size(data, encoding):
+        if encoding == Encoding.TEXT:
+            return len(data) if data.isascii() else len(data.encode("utf-8"))
+        if encoding == Encoding.RAW:
+            return len(data)
+        if encoding == Encoding.CHUNKS:
+            return sum(len(chunk) for chunk in data)
+        if encoding == Encoding.SPILLED:
+            return data.size
+        if encoding == Encoding.INVALID:
+            return FileNode._size(data[1], data[2])
+        return len(data) * 3 // 4 - (len(data) - len(data.rstrip("=")))
+
+    def counts(self):
+        """Считает (строки, слова, символы, байты) содержимого потоково, как wc"""
+        lines = words = chars = size = 0
+        in_word = False
+        for text in self.iter_text():
+            lines += text.count("\n")
+            words += len(text.split())
+            # Слово, разрезанное границей куска, посчитано дважды
+            if in_word and not text[0].isspace():
+                words -= 1
+            in_word = not text[-1].isspace()
+            chars += len(text)
+            size += len(text.encode("utf-8"))
+        return lines, words, chars, size
+
+    def __repr__(self):
+        return f"FileNode({self.data!r}, {self.encoding.name})"
+
+
+def _decode(data, encoding):
+    """Декодирует base64 (B64) или байты (RAW) в итоговую форму: (строка, TEXT) или (блоки, CHUNKS).
+
+    Если содержимое не UTF-8 (или не base64), исходные данные сохраняются: (ошибка, данные, форма), INVALID.
+    """
+    try:
+        if encoding == Encoding.B64:
+            chunks = _b64_chunks(data)
+        else:
+            view = memoryview(data)
+            chunks = [view[i:i + CHUNK_SIZE] for i in range(0, len(view), CHUNK_SIZE)]
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        for chunk in chunks:
+            decoder.decode(chunk)
+        decoder.decode(b"", True)
+        if len(chunks) > 1:
+            return tuple(chunks), Encoding.CHUNKS
+        return (str(chunks[0], "utf-8") if chunks else ""), Encoding.TEXT
+    except Exception as e:
+        return (f"Ошибка декодирования: {e}", data, encoding), Encoding.INVALID
+
+
+def _b64_chunks(data):
+    """Декодирует base64 в блоки байт по CHUNK_SIZE.
+
+    Отрезки по 4/3 * CHUNK_SIZE символов декодируются независимо. Если в строке есть
+    символы вне алфавита (их отбрасывает b64decode), выравнивание отрезков ломается —
+    тогда строка декодируется целиком, как раньше.
+    """
+    step = CHUNK_SIZE // 3 * 4
+    try:
+        return [base64.b64decode(data[i:i + step], validate=True) for i in range(0, len(data), step)]
+    except binascii.Error:
+        decoded = base64.b64decode(data)
+        return [decoded[i:i + CHUNK_SIZE] for i in range(0, len(decoded), CHUNK_SIZE)]
+
+
+class DirectoryNode:
+    """Директория VFS: словарь имя -> дочерний узел.
+
+    total_bytes, total_files, total_dirs — агрегаты поддерева (байты файлов, число файлов
+    и поддиректорий). None в total_bytes означает, что агрегаты еще не посчитаны; если они
+    посчитаны у директории, то посчитаны и у всех ее поддиректорий.
+
+    child_index — имена детей по возрастанию (None — еще не построен). Строится при первом
+    упорядоченном чтении; после этого новые и удаленные имена нужно вносить через
+    add_child()/remove_child(), прямые записи в children допустимы только до построения.
+    """
+    __slots__ = ("children", "total_bytes", "total_files", "total_dirs", "child_index")
+
+    kind = NodeType.DIRECTORY
+    is_dir = True
+    type = "directory"
+
+    def __init__(self, children=None):
+        self.children = {} if children is None else children
+        self.total_bytes = None
+        self.total_files = 0
+        self.total_dirs = 0
+        self.child_index = None
+
+    def copy(self):
+        """Неглубокая копия (дети общие) вместе с агрегатами и индексом — для копирования при записи"""
+        node = DirectoryNode(dict(self.children))
+        node.total_bytes = self.total_bytes
+        node.total_files = self.total_files
+        node.total_dirs = self.total_dirs
+        if self.child_index is not None:
+            node.child_index = list(self.child_index)
+        return node
+
+    def sorted_names(self):
+        """Имена детей по возрастанию; индекс строится один раз, дальше поддерживается при изменениях"""
+        index = self.child_index
+        if index is None:
+            index = self.child_index = sorted(self.children)
+        return index
+
+    def add_child(self, name, node):
+        """Кладет узел под именем name (заменяя прежний), обновляя индекс имен"""
+        index = self.child_index
+        if index is not None and name not in self.children:
+            bisect.insort(index, name)
+        self.children[name] = node
+
+    def remove_child(self, name):
+        """Удаляет ребенка и его имя из индекса; возвращает удаленный узел"""
+        node = self.children.pop(name)
+        index = self.child_index
+        if index is not None:
+            del index[bisect.bisect_left(index, name)]
+        return node
+
+    def names_range(self, prefix=""):
+        """Границы (начало, конец) имен с префиксом prefix в sorted_names()"""
+        index = self.sorted_names()
+        start = bisect.bisect_left(index, prefix)
+        if not prefix:
+            return start, len(index)
+        last = ord(prefix[-1])
+        if last < 0x10FFFF:
+            # Все имена с префиксом меньше префикса с увеличенным последним символом
+            return start, bisect.bisect_left(index, prefix[:-1] + chr(last + 1), start)
+        end = start
+        while end < len(index) and index[end].startswith(prefix):
+            end += 1
+        return start, end
+
+    def list_names(self, prefix="", offset=0, limit=None):
+        """Срез имен с префиксом prefix по возрастанию: пропускает offset, возвращает не более limit"""
+        start, end = self.names_range(prefix)
+        start = min(start + offset, end)
+        if limit is not None:
+            end = min(end, start + limit)
+        return self.child_index[start:end]
+
+    def totals(self):
+        """Возвращает (байты, файлы, поддиректории) поддерева, досчитывая недостающие агрегаты.
+
+        Обход итеративный, в обратном порядке: уже посчитанные поддеревья не обходятся.
+        """
+        if self.total_bytes is None and not self.stored_totals():
+            stack = [(self, False)]
+            while stack:
+                node, ready = stack.pop()
+                if not ready:
+                    stack.append((node, True))
+                    stack.extend((child, False) for child in node.children.values()
+                                 if child.is_dir and child.total_bytes is None and not child.stored_totals())
+                    continue
+                size = files = dirs = 0
+                for child in node.children.values():
+                    if child.is_dir:
+                        size += child.total_bytes
+                        files += child.total_files
+                        dirs += child.total_dirs + 1
+                    else:
+                        size += child.size()
+                        files += 1
+                node.total_files = files
+                node.total_dirs = dirs
+                # total_bytes последним: по нему другие потоки судят, что агрегаты готовы
+                node.total_bytes = size
+        return self.total_bytes, self.total_files, self.total_dirs
+
+    def stored_totals(self):
+        """Заполняет агрегаты без обхода детей, если они где-то хранятся (у нераскрытой директории
+        снимка — в таблице узлов); False — агрегаты нужно считать обходом"""
+        return False
+
+    def __repr__(self):
+        return f"DirectoryNode({sorted(self.children)!r})"
@@ -0,0 +1,198 @@
+import fnmatch
+import re
+import threading
+
+# Устаревшие записи триграмм (от перезаписанных файлов) не удаляются сразу; когда их
+# становится больше живых (и не меньше этого числа), индекс триграмм пересобирается
+MIN_STALE_REBUILD = 1024
+
+
+def _walk(path, node):
+    """Обходит поддерево: пары (абсолютный путь, узел), начиная с самого узла"""
+    stack = [(path, node)]
+    while stack:
+        path, node = stack.pop()
+        yield path, node
+        if node.is_dir:
+            prefix = path.rstrip("/")
+            for name, child in node.children.items():
+                stack.append((f"{prefix}/{name}", child))
+
+
+def _name(path):
+    return path[path.rfind("/") + 1:]
+
+
+def is_under(path, prefix):
+    """Лежит ли путь в поддереве prefix (включая сам prefix)"""
+    return prefix == "/" or path == prefix or path.startswith(prefix + "/")
+
+
+def text_trigrams(text):
+    """Триграммы строки — кортежи из трех символов (собираются через zip заметно быстрее срезов)"""
+    return zip(text, text[1:], text[2:])
+
+
+def file_trigrams(node):
+    """Триграммы текста файла (после casefold), посчитанные по кускам содержимого"""
+    grams = set()
+    carry = ""
+    for text in node.iter_text():
+        text = carry + text.casefold()
+        grams.update(text_trigrams(text))
+        carry = text[-2:]
+    return grams
+
+
+def required_literals(pattern):
+    """Строки, которые входят в любое совпадение регулярного выражения.
+
+    Разбор консервативный: для альтернатив и групп фильтровать не беремся (пустой список),
+    символ перед *, ? и {m,n} считается необязательным, классы и \\d, \\w и т. п. разрывают строку.
+    """
+    if "|" in pattern or "(" in pattern:
+        return []
+    runs = []
+    run = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        i += 1
+        if char == "\\":
+            escaped = pattern[i:i + 1]
+            i += 1
+            if escaped and not escaped.isalnum():
+                run.append(escaped)
+                continue
+        elif char in "*?{":
+            if run:
+                run.pop()
+            if char == "{":
+                close = pattern.find("}", i)
+                i = len(pattern) if close == -1 else close + 1
+        elif char == "[":
+            # Класс символов: пропускаем до закрывающей скобки (']' сразу после '[' или '[^' — литерал)
+            if pattern[i:i + 1] == "^":
+                i += 1
+            if pattern[i:i + 1] == "]":
+                i += 1
+            close = pattern.find("]", i)
+            i = len(pattern) if close == -1 else close + 1
+        elif char not in ".^$+}]":
+            run.append(char)
+            continue
+        runs.append("".join(run))
+        run = []
+    runs.append("".join(run))
+    return [literal for literal in runs if len(literal) >= 3]
+
+
+class VfsSearchIndex:
+    """Поисковые индексы дерева VFS.
+
+    names      — имя узла -> множество абсолютных путей (для find -name);
+    file_paths — файловый узел -> его путь (кандидаты для grep);
+    trigrams   — триграмма текста -> множество файловых узлов; строится при первом grep.
+
+    Триграммы привязаны к узлам, а не к путям, поэтому mv меняет только пути. Перезапись
+    файла создает новый узел; старый просто пропадает из file_paths (его записи в trigrams
+    отбрасываются при поиске). Содержимое для триграмм читается через file_node
+    (VirtualFileSystem.file_node), чтобы чтения учитывал кэш содержимого.
+    """
+
+    def __init__(self, root, file_node):
+        self.file_node = file_node
+        self.names = {}
+        self.file_paths = {}
+        self.trigrams = None
+        self._stale = 0
+        self._lock = threading.Lock()
+        for name, child in root.children.items():
+            self._add_subtree("/" + name, child)
+
+    def _add_subtree(self, path, node):
+        for child_path, child in _walk(path, node):
+            self.names.setdefault(_name(child_path), set()).add(child_path)
+            if not child.is_dir:
+                self.file_paths[child] = child_path
+                if self.trigrams is not None:
+                    self._index_content(child)
+
+    def _index_content(self, node):
+        index = self.trigrams
+        for gram in file_trigrams(self.file_node(node)):
+            posting = index.get(gram)
+            if posting is None:
+                index[gram] = {node}
+            else:
+                posting.add(node)
+
+    def _discard_name(self, path):
+        name = _name(path)
+        paths = self.names.get(name)
+        if paths is not None:
+            paths.discard(path)
+            if not paths:
+                del self.names[name]
+
+    def add(self, path, node):
+        """Учитывает новый узел (с поддеревом) по пути path"""
+        self._add_subtree(path, node)
+
+    def remove(self, path, node):
+        """Убирает узел (с поддеревом), который больше не лежит по пути path"""
+        for child_path, child in _walk(path, node):
+            self._discard_name(child_path)
+            if not child.is_dir and self.file_paths.pop(child, None) is not None:
+                self._stale += 1
+        if self.trigrams is not None and self._stale > max(MIN_STALE_REBUILD, len(self.file_paths)):
+            self.trigrams = None
+            self._stale = 0
+
+    def move(self, source_path, dest_path, node):
+        """Переносит пути поддерева; триграммы узлов при этом не меняются"""
+        for child_path, child in _walk(source_path, node):
+            self._discard_name(child_path)
+            new_path = dest_path + child_path[len(source_path):]
+            self.names.setdefault(_name(new_path), set()).add(new_path)
+            if not child.is_dir:
+                self.file_paths[child] = new_path
+
+    def find(self, prefix, pattern):
+        """Пути под prefix (включая сам prefix), имя которых подходит под glob-шаблон, по возрастанию"""
+        if any(char in pattern for char in "*?["):
+            match = re.compile(fnmatch.translate(pattern)).match
+            paths = [path for name, paths in self.names.items() if match(name) for path in paths]
+        else:
+            match = pattern.__eq__
+            paths = self.names.get(pattern, ())
+        found = sorted(path for path in paths if is_under(path, prefix))
+        # Корня в индексе имен нет; его имя, как в find, — сам "/"
+        if prefix == "/" and match("/"):
+            found.insert(0, "/")
+        return found
+
+    def grep_candidates(self, prefix, pattern):
+        """Файлы под prefix, которые могут содержать совпадение: [(путь, узел)] по возрастанию пути"""
+        literals = required_literals(pattern)
+        if not literals:
+            files = self.file_paths.items()
+        else:
+            with self._lock:
+                if self.trigrams is None:
+                    self.trigrams = {}
+                    for node in self.file_paths:
+                        self._index_content(node)
+            postings = []
+            for literal in literals:
+                for gram in set(text_trigrams(literal.casefold())):
+                    posting = self.trigrams.get(gram)
+                    if not posting:
+                        return []
+                    postings.append(posting)
+            postings.sort(key=len)
+            nodes = set(postings[0])
+            for posting in postings[1:]:
+                nodes &= posting
+            files = [(node, self.file_paths[node]) for node in nodes if node in self.file_paths]
+        return sorted((path, node) for node, path in files if is_under(path, prefix))
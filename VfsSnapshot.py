@@ -0,0 +1,229 @@
+import base64
+import binascii
+import mmap
+import os
+import struct
+import sys
+from collections import deque
+from VfsNode import DirectoryNode, FileNode, Encoding, LAZY_LOCK
+
+# Формат бинарного снимка VFS:
+#   заголовок | таблица узлов | блоб имен | блоб содержимого
+# Узлы лежат в порядке обхода в ширину: корень имеет индекс 0, дети каждой
+# директории идут подряд, поэтому для директории хранится индекс первого
+# ребенка и их количество, а для файла — смещение и длина содержимого.
+MAGIC = b"VFSSNAP\0"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQQQ")  # magic, version, node_count, nodes_off, names_off, blob_off
+NODE = struct.Struct("<IIIBB2xQQ")  # parent, name_off, name_len, type, flags, off/first, len/count
+
+NO_PARENT = 0xFFFFFFFF
+TYPE_FILE = 0
+TYPE_DIRECTORY = 1
+FLAG_B64 = 1  # содержимое хранится в base64, т.к. не удалось декодировать при конвертации
+
+
+def is_snapshot(path):
+    """Проверяет по сигнатуре, является ли файл бинарным снимком VFS"""
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def _file_payload(node):
+    """Возвращает (байты, флаги) содержимого файлового узла для записи в снимок"""
+    data, encoding = node.source()
+    if encoding == Encoding.RAW:
+        return bytes(data), 0
+    if encoding == Encoding.CHUNKS:
+        return b"".join(data), 0
+    if encoding == Encoding.B64:
+        try:
+            return base64.b64decode(data, validate=True), 0
+        except (binascii.Error, ValueError):
+            return data.encode("ascii", "replace"), FLAG_B64
+    return data.encode("utf-8"), 0
+
+
+def save_snapshot(root, path):
+    """Сохраняет дерево VFS в бинарный снимок"""
+    records = []
+    names = bytearray()
+    blob = bytearray()
+
+    # Обход в ширину: (узел, имя, индекс родителя)
+    queue = deque([(root, "", NO_PARENT)])
+    while queue:
+        node, name, parent = queue.popleft()
+        index = len(records)
+        encoded_name = name.encode("utf-8")
+        name_off = len(names)
+        names += encoded_name
+
+        if node.is_dir:
+            children = node.children
+            # Индекс первого ребенка = число уже записанных узлов + узлы в очереди
+            first = index + 1 + len(queue)
+            records.append([parent, name_off, len(encoded_name), TYPE_DIRECTORY, 0, first, len(children)])
+            for child_name, child in children.items():
+                queue.append((child, child_name, index))
+        else:
+            payload, flags = _file_payload(node)
+            records.append([parent, name_off, len(encoded_name), TYPE_FILE, flags, len(blob), len(payload)])
+            blob += payload
+
+    nodes_off = HEADER.size
+    names_off = nodes_off + NODE.size * len(records)
+    blob_off = names_off + len(names)
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(records), nodes_off, names_off, blob_off))
+        for record in records:
+            f.write(NODE.pack(*record))
+        f.write(names)
+        f.write(blob)
+    os.replace(tmp_path, path)
+
+
+class Snapshot:
+    """Отображенный в память снимок: читает записи таблицы узлов по индексу"""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        view = memoryview(self.map)
+        magic, version, self.node_count, nodes_off, names_off, blob_off = HEADER.unpack_from(view, 0)
+        if magic != MAGIC:
+            raise RuntimeError(f"Файл '{path}' не является снимком VFS")
+        if version != VERSION:
+            raise RuntimeError(f"Неподдерживаемая версия снимка VFS: {version}")
+
+        self.nodes = view[nodes_off:names_off]
+        self.names = view[names_off:blob_off]
+        self.blob = view[blob_off:]
+
+    def root(self):
+        """Возвращает корневую директорию; остальные узлы создаются при первом обращении"""
+        if self.node_count == 0 or NODE.unpack_from(self.nodes, 0)[3] != TYPE_DIRECTORY:
+            raise RuntimeError("Снимок VFS поврежден: нет корневой директории")
+        return SnapshotDirectoryNode(self, 0)
+
+    def children(self, index):
+        """Строит словарь дочерних узлов директории с заданным индексом"""
+        _, _, _, _, _, first, count = NODE.unpack_from(self.nodes, index * NODE.size)
+        names = self.names
+        blob = self.blob
+        children = {}
+        child_index = first
+        for _, name_off, name_len, node_type, flags, off, length in NODE.iter_unpack(
+                self.nodes[first * NODE.size:(first + count) * NODE.size]):
+            name = sys.intern(str(names[name_off:name_off + name_len], "utf-8"))
+            if node_type == TYPE_DIRECTORY:
+                children[name] = SnapshotDirectoryNode(self, child_index)
+            elif flags & FLAG_B64:
+                children[name] = FileNode(str(blob[off:off + length], "ascii"), Encoding.B64)
+            else:
+                children[name] = FileNode(blob[off:off + length], Encoding.RAW)
+            child_index += 1
+        return children
+
+    def totals(self, index):
+        """(байты, файлы, поддиректории) поддерева директории по таблице узлов, без создания узлов"""
+        size = files = dirs = 0
+        stack = [index]
+        while stack:
+            _, _, _, _, _, first, count = NODE.unpack_from(self.nodes, stack.pop() * NODE.size)
+            records = NODE.iter_unpack(self.nodes[first * NODE.size:(first + count) * NODE.size])
+            for child_index, (_, _, _, node_type, flags, off, length) in enumerate(records, first):
+                if node_type == TYPE_DIRECTORY:
+                    dirs += 1
+                    stack.append(child_index)
+                    continue
+                files += 1
+                if flags & FLAG_B64:
+                    # Размер считается так же, как FileNode.size() для base64
+                    size += FileNode(str(self.blob[off:off + length], "ascii"), Encoding.B64).size()
+                else:
+                    size += length
+        return size, files, dirs
+
+
+class SnapshotDirectoryNode(DirectoryNode):
+    """Директория из снимка: слот children заполняется из таблицы узлов при первом обращении.
+
+    После заполнения доступ к children идет напрямую через слот, без накладных расходов.
+    """
+    __slots__ = ("_snapshot", "_index")
+
+    def __init__(self, snapshot, index):
+        self._snapshot = snapshot
+        self._index = index
+        self.total_bytes = None
+        self.total_files = 0
+        self.total_dirs = 0
+        self.child_index = None
+
+    def __getattr__(self, name):
+        # Вызывается только пока слот children не заполнен
+        if name != "children":
+            raise AttributeError(name)
+        with LAZY_LOCK:
+            try:
+                # Слот мог заполнить другой поток, пока мы ждали блокировку
+                return DirectoryNode.children.__get__(self)
+            except AttributeError:
+                self.children = self._snapshot.children(self._index)
+                return self.children
+
+    def is_loaded(self):
+        """Раскрыта ли директория (заполнен ли слот children)"""
+        try:
+            DirectoryNode.children.__get__(self)
+        except AttributeError:
+            return False
+        return True
+
+    def stored_totals(self):
+        # Нераскрытая директория не менялась (изменения идут через children) — таблица снимка верна
+        if self.is_loaded():
+            return False
+        size, files, dirs = self._snapshot.totals(self._index)
+        self.total_files = files
+        self.total_dirs = dirs
+        self.total_bytes = size
+        return True
+
+    def __repr__(self):
+        return f"SnapshotDirectoryNode(#{self._index})"
+
+
+def load_snapshot(path):
+    """Открывает снимок через mmap за постоянное время; директории раскрываются лениво,
+    содержимое файлов — срезы отображения без копирования.
+
+    Возвращает (корневой узел, снимок), снимок должен жить столько же, сколько дерево.
+    """
+    snapshot = Snapshot(path)
+    return snapshot.root(), snapshot
+
+
+def main():
+    """Конвертер CSV -> бинарный снимок"""
+    if len(sys.argv) != 3:
+        print("Использование: python VfsSnapshot.py <путь_к_CSV> <путь_к_снимку>")
+        print("Пример: python VfsSnapshot.py utils/vfs_structure.csv utils/vfs_structure.vfs")
+        sys.exit(1)
+
+    from VirtualFileSystem import VirtualFileSystem
+
+    vfs = VirtualFileSystem(sys.argv[1])
+    vfs.save_snapshot(sys.argv[2])
+    print(f"Снимок VFS сохранен в '{sys.argv[2]}'")
+
+
+if __name__ == "__main__":
+    main()
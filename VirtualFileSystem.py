@@ -1,167 +1,814 @@
 import csv
 import os
+import sys
 import base64
+import threading
+from functools import lru_cache
+import VfsSnapshot
+from VfsNode import DirectoryNode, FileNode, Encoding
+
+
+@lru_cache(maxsize=4096)
+def normalize_path(current_path, target_path):
+    """Склеивает путь с текущей директорией и нормализует '.', '..' и повторные '/'"""
+    if target_path.startswith("/"):
+        full_path = target_path
+    elif current_path == "/":
+        full_path = "/" + target_path
+    else:
+        full_path = current_path.rstrip("/") + "/" + target_path
+
+    stack = []
+    for part in full_path.split('/'):
+        if part == '..':
+            if stack:
+                stack.pop()
+        elif part and part != '.':
+            stack.append(part)
+
+    return '/' + '/'.join(stack)
+
+
+def path_parts(normalized_path):
+    """Возвращает компоненты нормализованного пути ('/' -> [])"""
+    return normalized_path[1:].split('/') if normalized_path != '/' else []
+
+
+def split_path(normalized_path):
+    """Разбивает нормализованный путь на родительский путь и имя узла"""
+    parent_path, _, name = normalized_path.rpartition('/')
+    return parent_path or '/', name
+
+
+def image_format(path):
+    """Формат образа VFS по расширению файла: "snapshot" (.vfs), "tar", "jsonl" или "csv" """
+    lower = path.lower()
+    if lower.endswith((".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")):
+        return "tar"
+    if lower.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    if lower.endswith(".vfs"):
+        return "snapshot"
+    return "csv"
+
+
+def node_from_row(row):
+    """Создает узел по строке CSV; возвращает (части пути, узел)"""
+    parts = [sys.intern(p) for p in row["path"].strip().strip("/").split("/") if p]
+    node_type = row["type"].strip()
+    content = row.get("content", "")
+    content_b64 = row.get("content_b64", "")
+
+    if node_type == "file":
+        if content_b64:
+            return parts, FileNode(content_b64, Encoding.B64)
+        return parts, FileNode(content)
+    return parts, DirectoryNode()
+
+
+def _tee(pieces, sink):
+    """Пропускает куски дальше, попутно складывая их в список"""
+    for piece in pieces:
+        sink.append(piece)
+        yield piece
 
 
 class VirtualFileSystem:
-    def __init__(self, vfs_path):
-        self.vfs = {"type": "directory", "content": {}}
-        self.load_vfs(vfs_path)
-        self.vfs = self._process_vfs_data(self.vfs)
+    def __init__(self, vfs_path, lazy=True, workers=None, journal=None, cache_bytes=None):
+        self.vfs = DirectoryNode()
+        self.vfs_path = vfs_path
+        self.lazy = lazy
+        # Кэш последнего родителя: строки CSV обычно идут группами по директориям
+        self._last_parent_parts = None
+        self._last_parent = None
+        self._snapshot = None
+        self._path_index = {}
+        self._index_children = {}
+        # Копирование при записи: после fork()/checkpoint() дерево общее с другой версией,
+        # и перед изменением директории копируются по пути от корня (см. _writable_dir)
+        self._shared = False
+        self._owned = set()
+        # Журнал изменений поверх базового образа; у версий из fork() изменения копятся в _fork_log,
+        # а _fork_base — корень исходной VFS на момент fork(), к которому они применимы
+        self.journal = None
+        self._fork_log = None
+        self._fork_base = None
+        # Индексы для find/grep строятся при первом поиске и дальше обновляются при изменениях
+        self._search = None
+        self._search_lock = threading.Lock()
+        # Агрегаты поддеревьев (DirectoryNode.totals) поддерживаются при изменениях после загрузки
+        self._aggregates = False
+        # Кэш содержимого с ограничением памяти: холодное содержимое файлов вытесняется на диск
+        self.content_cache = None
+        if cache_bytes:
+            from VfsContentCache import VfsContentCache
+
+            self.content_cache = VfsContentCache(cache_bytes)
+        if VfsSnapshot.is_snapshot(vfs_path):
+            self.load_snapshot(vfs_path)
+        elif image_format(vfs_path) == "tar":
+            self.load_tar(vfs_path)
+        elif image_format(vfs_path) == "jsonl":
+            self.load_jsonl(vfs_path)
+        elif workers and workers > 1:
+            self.load_vfs_parallel(vfs_path, workers)
+        else:
+            self.load_vfs(vfs_path)
+        if not lazy:
+            # Жадный режим: декодируем все base64-файлы сразу после загрузки
+            self.vfs = self._process_vfs_data(self.vfs)
+        if self._snapshot is None:
+            # Снимок открывается без обхода дерева, поэтому его агрегаты считаются при первом du
+            self.vfs.totals()
+        self._aggregates = True
+        self.clear_path_index()
+        if journal:
+            self.open_journal(journal)
 
     def load_vfs(self, vfs_path):
         """Загружает VFS из CSV"""
         if not os.path.exists(vfs_path):
             raise FileNotFoundError(f"Файл VFS '{vfs_path}' не найден")
 
+        # Содержимое больших файлов не помещается в стандартный лимит поля csv (128 КБ)
+        csv.field_size_limit(sys.maxsize)
         with open(vfs_path, "r", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                path = row["path"].strip()
-                node_type = row["type"].strip()
-                content = row.get("content", "")
-                content_b64 = row.get("content_b64", "")
-
-                node_data = {"type": node_type}
-                if node_type == "file":
-                    if content_b64:
-                        node_data["content_b64"] = content_b64
+            self._add_rows(node_from_row(row) for row in csv.DictReader(f))
+
+    def load_vfs_parallel(self, vfs_path, workers):
+        """Загружает VFS из CSV параллельно: шарды по диапазонам байт разбираются в пуле процессов,
+        их поддеревья сливаются в исходном порядке. Маленькие файлы грузятся обычным способом."""
+        if not os.path.exists(vfs_path):
+            raise FileNotFoundError(f"Файл VFS '{vfs_path}' не найден")
+
+        from ParallelLoader import load_parallel
+
+        if not load_parallel(self.vfs, vfs_path, workers):
+            self.load_vfs(vfs_path)
+        elif self.content_cache is not None:
+            # Шарды вливаются в дерево целиком — в кэш их файлы попадают после слияния
+            for node in self._iter_files(self.vfs):
+                self.content_cache.admit(node)
+
+    def load_tar(self, tar_path):
+        """Загружает VFS из tar-архива (сжатие определяется само) потоково, запись за записью;
+        содержимое файлов хранится байтами, без base64"""
+        from VfsArchive import iter_tar
+
+        self._add_rows(iter_tar(tar_path))
+
+    def load_jsonl(self, jsonl_path):
+        """Загружает VFS из JSON Lines (по записи на узел) потоково, строка за строкой"""
+        from VfsArchive import iter_jsonl
+
+        self._add_rows(iter_jsonl(jsonl_path))
+
+    def load_snapshot(self, snapshot_path):
+        """Загружает VFS из бинарного снимка (mmap, содержимое файлов не копируется)"""
+        self.vfs, self._snapshot = VfsSnapshot.load_snapshot(snapshot_path)
+
+    def save_snapshot(self, snapshot_path):
+        """Сохраняет текущее дерево VFS в бинарный снимок"""
+        VfsSnapshot.save_snapshot(self.vfs, snapshot_path)
+
+    def save_tar(self, tar_path):
+        """Сохраняет дерево в tar-архив; сжатие — по расширению (.tar.gz, .tar.bz2, .tar.xz)"""
+        from VfsArchive import save_tar
+
+        save_tar(self.vfs, tar_path)
+
+    def save_jsonl(self, jsonl_path):
+        """Сохраняет дерево в JSON Lines"""
+        from VfsArchive import save_jsonl
+
+        save_jsonl(self.vfs, jsonl_path)
+
+    def save_image(self, path):
+        """Сохраняет дерево в формате, выбранном по расширению файла (см. image_format)"""
+        fmt = image_format(path)
+        if fmt == "snapshot":
+            self.save_snapshot(path)
+        elif fmt == "tar":
+            self.save_tar(path)
+        elif fmt == "jsonl":
+            self.save_jsonl(path)
+        else:
+            self.save_csv(path)
+
+    def save_csv(self, csv_path):
+        """Сохраняет текущее дерево VFS в CSV того же формата, что читает load_vfs"""
+        tmp_path = csv_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["path", "type", "content", "content_b64"])
+            stack = [("", self.vfs)]
+            while stack:
+                prefix, directory = stack.pop()
+                for name, node in directory.children.items():
+                    path = f"{prefix}/{name}"
+                    if node.is_dir:
+                        writer.writerow([path, "directory", "", ""])
+                        stack.append((path, node))
+                        continue
+                    data, encoding = node.source()
+                    if encoding == Encoding.B64:
+                        writer.writerow([path, "file", "", data])
+                    elif encoding == Encoding.RAW:
+                        writer.writerow([path, "file", "", base64.b64encode(data).decode("ascii")])
+                    elif encoding == Encoding.CHUNKS:
+                        writer.writerow([path, "file", "", base64.b64encode(b"".join(data)).decode("ascii")])
                     else:
-                        node_data["content"] = content
-                else:
-                    node_data["content"] = {}
+                        writer.writerow([path, "file", data, ""])
+        os.replace(tmp_path, csv_path)
+
+    def open_journal(self, journal_path):
+        """Применяет к дереву изменения из журнала и дальше дописывает в него новые"""
+        from VfsJournal import VfsJournal
 
-                self.add_node(path, node_type, node_data)
+        journal = VfsJournal(journal_path)
+        for record in journal.records():
+            self._replay(record)
+        self.journal = journal
+
+    def _replay(self, record):
+        """Повторяет одну запись журнала"""
+        op = record["op"]
+        if op == "mkdir":
+            self.make_directory("/", record["path"], parents=record.get("parents", False))
+        elif op == "touch":
+            self.create_file("/", record["path"])
+        elif op == "mv":
+            self.move_node("/", record["src"], record["dst"])
+        elif op == "write":
+            self.write_file("/", record["path"], record["content"], append=record.get("append", False))
+        else:
+            raise RuntimeError(f"Неизвестная запись журнала: {op}")
+
+    def _log(self, record):
+        """Записывает изменение в журнал (и в список изменений версии из fork())"""
+        if self.journal is not None:
+            self.journal.append(record)
+        if self._fork_log is not None:
+            self._fork_log.append(record)
+
+    def compact(self, output_path=None):
+        """Сохраняет дерево с примененным журналом как новый базовый образ и очищает журнал.
+
+        Бинарный снимок остается снимком, остальные форматы выбираются по расширению;
+        по умолчанию образ перезаписывается на месте.
+        """
+        output_path = output_path or self.vfs_path
+        if VfsSnapshot.is_snapshot(self.vfs_path):
+            self.save_snapshot(output_path)
+        else:
+            self.save_image(output_path)
+        if self.journal is not None:
+            self.journal.truncate()
 
     def add_node(self, path, node_type, node_data):
         """Добавляет узел (файл или директорию) в дерево"""
-        parts = [p for p in path.strip("/").split("/") if p]
-        node = self.vfs
+        self._add_rows([([sys.intern(p) for p in path.strip("/").split("/") if p], node_data)])
 
-        for i, part in enumerate(parts):
-            is_last = i == len(parts) - 1
-
-            if is_last:
-                node["content"][part] = node_data
-            else:
-                if part not in node["content"]:
-                    node["content"][part] = {"type": "directory", "content": {}}
-                elif node["content"][part]["type"] != "directory":
+    def _add_rows(self, rows):
+        """Добавляет узлы (части пути, узел) подряд, как при загрузке.
+
+        Кэш последнего родителя живет только внутри вызова: mv и другие изменения дерева
+        о нем не знают, и после них он мог бы указывать на перемещенную директорию.
+        """
+        try:
+            for parts, node_data in rows:
+                self._add_parts(parts, node_data)
+        finally:
+            self._last_parent_parts = None
+            self._last_parent = None
+
+    def _add_parts(self, parts, node_data):
+        """Добавляет узел по уже разбитому пути"""
+        if not parts:
+            return
+        if self.content_cache is not None and not node_data.is_dir:
+            self.content_cache.admit(node_data)
+        # Узел может заменить целое поддерево — поисковый индекс проще построить заново
+        self._search = None
+        parent_parts = tuple(parts[:-1])
+
+        if self._shared:
+            if node_data.is_dir:
+                existing = self._resolve_normalized("/" + "/".join(parts))
+                if existing is not None and existing.is_dir:
+                    return
+            # Дерево общее с другой версией: копируем путь до родителя
+            self._writable_dir(parent_parts, create=True).add_child(parts[-1], node_data)
+            self._invalidate_subtree("/" + "/".join(parts))
+            self._invalidate_totals(parent_parts)
+            return
+
+        if parent_parts == self._last_parent_parts:
+            # Тот же родитель, что и у предыдущей строки — не идем от корня
+            node = self._last_parent
+        else:
+            node = self.vfs
+            for i, part in enumerate(parent_parts):
+                child = node.children.get(part)
+                if child is None:
+                    child = DirectoryNode()
+                    node.add_child(part, child)
+                elif not child.is_dir:
                     raise RuntimeError(f"Невозможно создать '{'/'.join(parts[:i + 1])}': файл блокирует путь")
-                node = node["content"][part]
+                node = child
+            self._last_parent_parts = parent_parts
+            self._last_parent = node
+
+        if node_data.is_dir:
+            existing = node.children.get(parts[-1])
+            if existing is not None and existing.is_dir:
+                # Директория уже создана по пути своего содержимого (в tar запись "a/" может идти
+                # после "a/f.txt") — запись директории ее не заменяет пустой
+                return
+        if node.child_index is None:
+            # Индекс имен при загрузке еще не построен — пишем в словарь без вызова метода
+            node.children[parts[-1]] = node_data
+        else:
+            node.add_child(parts[-1], node_data)
+        if len(self._path_index) > 1:
+            self._invalidate_subtree("/" + "/".join(parts))
+        if self._aggregates:
+            self._invalidate_totals(parent_parts)
+
+        # Узел заменил предка закэшированного родителя — кэш больше не в дереве
+        if self._last_parent_parts[:len(parts)] == tuple(parts):
+            self._last_parent_parts = None
+            self._last_parent = None
+
+    def _invalidate_totals(self, parts):
+        """Сбрасывает агрегаты директорий от корня до parts — они досчитаются при следующем du"""
+        node = self.vfs
+        node.total_bytes = None
+        for part in parts:
+            node = node.children[part]
+            node.total_bytes = None
+
+    def _adjust_totals(self, parts, node, sign):
+        """Прибавляет (sign=1) или вычитает (sign=-1) поддерево node из агрегатов директорий
+        от корня до parts. Директории без посчитанных агрегатов пропускаются."""
+        delta = None
+        directory = self.vfs
+        for i in range(len(parts) + 1):
+            if directory.total_bytes is not None:
+                if delta is None:
+                    if node.is_dir:
+                        size, files, dirs = node.totals()
+                        delta = (sign * size, sign * files, sign * (dirs + 1))
+                    else:
+                        delta = (sign * node.size(), sign, 0)
+                directory.total_files += delta[1]
+                directory.total_dirs += delta[2]
+                directory.total_bytes += delta[0]
+            if i < len(parts):
+                directory = directory.children[parts[i]]
+
+    def disk_usage(self, current_path, path):
+        """Возвращает (байты, файлы, поддиректории) для пути; у файла — (размер, 1, 0)"""
+        node = self.resolve_path(current_path, path)
+        if node is None:
+            raise RuntimeError(f"du: невозможно получить доступ к '{path}': Нет такого файла или каталога")
+        return self.node_usage(node)
+
+    @staticmethod
+    def node_usage(node):
+        """(байты, файлы, поддиректории) уже найденного узла; у файла — (размер, 1, 0)"""
+        if node.is_dir:
+            return node.totals()
+        return node.size(), 1, 0
+
+    @staticmethod
+    def _iter_files(root):
+        """Обходит все файловые узлы поддерева"""
+        stack = [root]
+        while stack:
+            for child in stack.pop().children.values():
+                if child.is_dir:
+                    stack.append(child)
+                else:
+                    yield child
 
     def _process_vfs_data(self, node, path=""):
         """Обрабатывает данные VFS, декодируя base64 если нужно"""
-        if node['type'] == 'file' and 'content_b64' in node:
-            try:
-                node['content'] = base64.b64decode(node['content_b64']).decode('utf-8')
-                del node['content_b64']
-            except Exception as e:
-                node['content'] = f"Ошибка декодирования: {e}"
-        elif node['type'] == 'directory' and "content" in node and isinstance(node['content'], dict):
-            for name, child in node['content'].items():
+        if not node.is_dir:
+            node.materialize()
+        else:
+            for name, child in node.children.items():
                 child_path = f"{path}/{name}" if path else name
-                node['content'][name] = self._process_vfs_data(child, child_path)
+                self._process_vfs_data(child, child_path)
         return node
 
+    def _read_file(self, node):
+        """Возвращает текст файла, при первом обращении декодируя содержимое и кэшируя результат в узле"""
+        return node.read()
+
     def resolve_path(self, current_path, target_path):
         """Разрешает относительный и абсолютный путь"""
-        if target_path.startswith("/"):
-            full_path = target_path
-        else:
-            if current_path == "/":
-                full_path = "/" + target_path
-            else:
-                full_path = current_path.rstrip("/") + "/" + target_path
-
-        # Нормализуем путь
-        parts = full_path.split('/')
-        stack = []
-        for part in parts:
-            if part == '..':
-                if stack and stack[-1] != '..':
-                    stack.pop()
-            elif part and part != '.':
-                stack.append(part)
-
-        if not stack:
-            normalized_path = '/'
+        return self._resolve_normalized(normalize_path(current_path, target_path))
+
+    def _resolve_normalized(self, path):
+        """Находит узел по нормализованному абсолютному пути через индекс путей"""
+        node = self._path_index.get(path)
+        if node is not None:
+            return node
+
+        # Идем от ближайшего закэшированного предка
+        parts = path.strip("/").split("/")
+        depth = len(parts) - 1
+        while depth > 0:
+            node = self._path_index.get("/" + "/".join(parts[:depth]))
+            if node is not None:
+                break
+            depth -= 1
         else:
-            normalized_path = '/' + '/'.join(stack)
+            node = self.vfs
 
-        # Теперь разрешаем путь
-        parts = normalized_path.strip("/").split("/") if normalized_path != "/" else []
-        node = self.vfs
-        for part in parts:
-            if not part:
-                continue
-            if "content" not in node or part not in node["content"]:
+        parent_path = "/" + "/".join(parts[:depth]) if depth else "/"
+        for i in range(depth, len(parts)):
+            if not node.is_dir:
+                return None
+            node = node.children.get(parts[i])
+            if node is None:
                 return None
-            node = node["content"][part]
+            child_path = "/" + "/".join(parts[:i + 1])
+            self._path_index[child_path] = node
+            self._index_children.setdefault(parent_path, set()).add(child_path)
+            parent_path = child_path
         return node
 
+    def clear_path_index(self):
+        """Сбрасывает индекс путей (в нем остается только корень)"""
+        # Индекс абсолютный путь -> узел; заполняется при разрешении путей.
+        # Предки закэшированного пути всегда тоже в индексе, а _index_children хранит
+        # закэшированных детей каждого пути — так инвалидация обходит только свое поддерево.
+        self._path_index = {"/": self.vfs}
+        self._index_children = {}
+
+    def _invalidate_subtree(self, path):
+        """Удаляет из индекса путь и все пути под ним (остальные записи остаются валидными)"""
+        if self._path_index.pop(path, None) is None:
+            return
+        siblings = self._index_children.get(split_path(path)[0])
+        if siblings:
+            siblings.discard(path)
+
+        stack = [path]
+        while stack:
+            children = self._index_children.pop(stack.pop(), None)
+            if children:
+                for child_path in children:
+                    del self._path_index[child_path]
+                stack.extend(children)
+
     def get_file_content(self, current_path, file_path):
         """Возвращает содержимое файла"""
-        node = self.resolve_path(current_path, file_path)
-        if node and node["type"] == "file":
-            return node["content"]
+        node = self.get_file_node(current_path, file_path)
+        if node is not None:
+            return self._read_file(node)
+        return None
+
+    def cache_stats(self):
+        """Счетчики кэша содержимого (попадания, промахи, вытеснения) или None, если он выключен"""
+        if self.content_cache is None:
+            return None
+        return self.content_cache.to_dict()
+
+    def get_file_node(self, current_path, file_path):
+        """Возвращает файловый узел (для потокового чтения) или None, если файла нет"""
+        return self.file_node(self.resolve_path(current_path, file_path))
+
+    def file_node(self, node):
+        """Узел, уже найденный resolve_path, если это файл (отмечается в кэше содержимого перед
+        чтением), иначе None. Все чтения содержимого файлов идут через него"""
+        if node and not node.is_dir:
+            if self.content_cache is not None:
+                self.content_cache.access(node)
+            return node
         return None
 
+    def search_index(self):
+        """Возвращает поисковый индекс, при первом обращении строя его обходом дерева"""
+        if self._search is None:
+            with self._search_lock:
+                if self._search is None:
+                    from VfsSearchIndex import VfsSearchIndex
+
+                    self._search = VfsSearchIndex(self.vfs, self.file_node)
+        return self._search
+
+    def find(self, current_path, path, pattern):
+        """Абсолютные пути под path, имя которых подходит под glob-шаблон (find -name)"""
+        start = normalize_path(current_path, path)
+        node = self._resolve_normalized(start)
+        if node is None:
+            raise RuntimeError(f"find: '{path}': Нет такого файла или каталога")
+        return self.search_index().find(start, pattern)
+
+    def grep_files(self, current_path, path, pattern):
+        """Файлы под path, которые могут содержать совпадение с шаблоном: [(путь, узел)].
+
+        Кандидаты отбираются по триграммам обязательных подстрок шаблона; окончательную
+        проверку по строкам делает вызывающий.
+        """
+        start = normalize_path(current_path, path)
+        node = self._resolve_normalized(start)
+        if node is None:
+            raise RuntimeError(f"grep: '{path}': Нет такого файла или каталога")
+        if not node.is_dir:
+            return [(start, node)]
+        return self.search_index().grep_candidates(start, pattern)
+
     def get_motd(self):
         """Получает содержимое файла /motd, если он существует"""
-        node = self.resolve_path("/", "motd")
-        if node and node["type"] == "file":
-            return node["content"]
+        node = self.file_node(self.resolve_path("/", "motd"))
+        if node is not None:
+            return self._read_file(node)
         return None
 
     def move_node(self, current_path, source_path, dest_path):
         """Перемещает узел (файл/директорию) из source в dest"""
         # Получаем родителя source и сам узел
         source_parent_path, source_name = self._get_parent_path_and_name(source_path, current_path)
-        source_parent = self.resolve_path(current_path, source_parent_path)
-        if not source_parent or source_name not in source_parent["content"]:
+        source_parent = self._resolve_normalized(source_parent_path)
+        if not source_parent or not source_parent.is_dir or source_name not in source_parent.children:
             raise RuntimeError(f"mv: невозможно найти '{source_path}': Нет такого файла или директории")
 
-        source_node = source_parent["content"][source_name]
+        source_node = source_parent.children[source_name]
+        source_full = source_parent_path.rstrip("/") + "/" + source_name
 
         # Определяем, является ли dest директорией
-        dest_node = self.resolve_path(current_path, dest_path)
-        if dest_node and dest_node["type"] == "directory":
+        dest_full = normalize_path(current_path, dest_path)
+        dest_node = self._resolve_normalized(dest_full)
+        if dest_node and dest_node.is_dir:
             # dest — директория, перемещаем туда с оригинальным именем
             dest_parent = dest_node
+            dest_parent_path = dest_full
             dest_name = source_name
         else:
             # dest — файл, определяем его родителя и имя
             dest_parent_path, dest_name = self._get_parent_path_and_name(dest_path, current_path)
-            dest_parent = self.resolve_path(current_path, dest_parent_path)
-            if not dest_parent:
+            dest_parent = self._resolve_normalized(dest_parent_path)
+            if not dest_parent or not dest_parent.is_dir:
                 raise RuntimeError(f"mv: невозможно найти '{dest_parent_path}': Нет такого пути")
 
+        # Директорию нельзя переместить внутрь нее самой
+        if dest_parent_path == source_full or dest_parent_path.startswith(source_full + "/"):
+            raise RuntimeError(f"mv: невозможно переместить '{source_path}' в собственный подкаталог '{dest_path}'")
+
         # Проверяем, не перезаписываем ли мы существующий узел
-        if dest_name in dest_parent["content"]:
+        if dest_name in dest_parent.children:
             raise RuntimeError(
                 f"mv: невозможно переместить '{source_name}' в '{dest_path}': файл/директория уже существует")
 
+        if self._shared:
+            # Изменяемые директории не должны быть общими с другими версиями
+            source_parent = self._writable_dir(path_parts(source_parent_path))
+            dest_parent = self._writable_dir(path_parts(dest_parent_path))
+
         # Удаляем из старого места
-        del source_parent["content"][source_name]
+        source_parent.remove_child(source_name)
 
         # Добавляем в новое место
-        dest_parent["content"][dest_name] = source_node
+        dest_parent.add_child(sys.intern(dest_name), source_node)
 
-    def _get_parent_path_and_name(self, path, current_path):
-        """Разбивает путь на родительский путь и имя узла"""
-        if path.startswith("/"):
-            full_path = path
+        # Старые пути поддерева больше не ведут к узлам; новые попадут в индекс при обращении
+        self._invalidate_subtree(source_full)
+
+        self._adjust_totals(path_parts(source_parent_path), source_node, -1)
+        self._adjust_totals(path_parts(dest_parent_path), source_node, 1)
+
+        dest_full = dest_parent_path.rstrip("/") + "/" + dest_name
+        if self._search is not None:
+            self._search.move(source_full, dest_full, source_node)
+
+        self._log({"op": "mv", "src": source_full, "dst": dest_full})
+
+    def make_directory(self, current_path, path, parents=False):
+        """Создает директорию; parents=True создает недостающих предков и не ругается на существующую"""
+        full_path = normalize_path(current_path, path)
+        if full_path == "/":
+            if parents:
+                return
+            raise RuntimeError("mkdir: невозможно создать директорию '/': Файл существует")
+
+        parent_path, name = split_path(full_path)
+        existing = self._resolve_normalized(full_path)
+        if existing is not None:
+            if parents and existing.is_dir:
+                return
+            raise RuntimeError(f"mkdir: невозможно создать директорию '{path}': Файл существует")
+
+        if parents:
+            # Первый несуществующий предок: с него начинается созданная цепочка директорий
+            created = full_path
+            while True:
+                ancestor = split_path(created)[0]
+                if ancestor == "/" or self._resolve_normalized(ancestor) is not None:
+                    break
+                created = ancestor
+            self._writable_dir(path_parts(full_path), create=True)
+            node = self._resolve_normalized(created)
+            self._adjust_totals(path_parts(split_path(created)[0]), node, 1)
+            if self._search is not None:
+                self._search.add(created, node)
         else:
-            if current_path == "/":
-                full_path = "/" + path
-            else:
-                full_path = current_path.rstrip("/") + "/" + path
+            parent = self._resolve_normalized(parent_path)
+            if parent is None:
+                raise RuntimeError(f"mkdir: невозможно создать директорию '{path}': Нет такого файла или каталога")
+            if not parent.is_dir:
+                raise RuntimeError(f"mkdir: невозможно создать директорию '{path}': Не директория")
+            node = DirectoryNode()
+            self._writable_dir(path_parts(parent_path)).add_child(sys.intern(name), node)
+            self._adjust_totals(path_parts(parent_path), node, 1)
+            if self._search is not None:
+                self._search.add(full_path, node)
 
-        parts = full_path.strip("/").split("/")
-        if len(parts) == 0:
-            raise RuntimeError("Невозможно переместить корень")
+        self._log({"op": "mkdir", "path": full_path, "parents": parents})
+
+    def create_file(self, current_path, path):
+        """Создает пустой файл, если его еще нет (команда touch)"""
+        full_path = normalize_path(current_path, path)
+        if self._resolve_normalized(full_path) is not None:
+            return
+
+        parent_path, name = split_path(full_path)
+        parent = self._resolve_normalized(parent_path)
+        if parent is None:
+            raise RuntimeError(f"touch: невозможно выполнить touch '{path}': Нет такого файла или каталога")
+        if not parent.is_dir:
+            raise RuntimeError(f"touch: невозможно выполнить touch '{path}': Не директория")
+        node = FileNode()
+        self._writable_dir(path_parts(parent_path)).add_child(sys.intern(name), node)
+        self._adjust_totals(path_parts(parent_path), node, 1)
+        if self._search is not None:
+            self._search.add(full_path, node)
+
+        self._log({"op": "touch", "path": full_path})
+
+    def write_file(self, current_path, path, content, append=False):
+        """Записывает (или дописывает) текст в файл, создавая его при необходимости"""
+        self._write_pieces(current_path, path, (content,), append)
+
+    def write_lines(self, current_path, path, lines, append=False):
+        """Записывает строки из итератора в файл потоково, блоками (перенаправление > и >>).
+
+        Путь проверяется до чтения первой строки, так что при ошибке источник не запускается.
+        """
+        self._write_pieces(current_path, path, (line + "\n" for line in lines), append)
+
+    def _write_pieces(self, current_path, path, pieces, append):
+        """Общая часть write_file и write_lines"""
+        full_path = normalize_path(current_path, path)
+        if full_path == "/":
+            raise RuntimeError(f"'{path}': Это директория")
+
+        parent_path, name = split_path(full_path)
+        parent = self._resolve_normalized(parent_path)
+        if parent is None or not parent.is_dir:
+            raise RuntimeError(f"'{path}': Нет такого файла или каталога")
+        existing = parent.children.get(name)
+        if existing is not None and existing.is_dir:
+            raise RuntimeError(f"'{path}': Это директория")
+
+        logged = None
+        if self.journal is not None or self._fork_log is not None:
+            # Для журнала нужен сам записанный текст
+            logged = []
+            pieces = _tee(pieces, logged)
+
+        # Всегда новый узел: старый может быть общим с другой версией (fork)
+        node = FileNode.from_pieces(pieces, self.file_node(existing) if append else None)
+        if self.content_cache is not None:
+            self.content_cache.admit(node)
+        self._writable_dir(path_parts(parent_path)).add_child(sys.intern(name), node)
+        self._invalidate_subtree(full_path)
+        if existing is not None:
+            self._adjust_totals(path_parts(parent_path), existing, -1)
+        self._adjust_totals(path_parts(parent_path), node, 1)
+        if self._search is not None:
+            if existing is not None:
+                self._search.remove(full_path, existing)
+            self._search.add(full_path, node)
+
+        if logged is not None:
+            self._log({"op": "write", "path": full_path, "content": "".join(logged), "append": append})
+
+    def _writable_dir(self, parts, create=False):
+        """Возвращает директорию по частям пути, которую эта версия может менять на месте.
 
-        name = parts[-1]
-        parent_path = "/" + "/".join(parts[:-1]) if len(parts) > 1 else "/"
-        return parent_path, name
\ No newline at end of file
+        Пока дерево ни с кем не разделено, это просто узел дерева. После fork()/checkpoint()
+        общие директории на пути от корня копируются (неглубоко: дети остаются общими),
+        так что копируется только путь к изменяемому месту. create=True создает недостающие
+        директории, как при загрузке.
+        """
+        node = self.vfs
+        if self._shared and id(node) not in self._owned:
+            node = self.vfs = node.copy()
+            self._owned.add(id(node))
+            self._path_index["/"] = node
+
+        path = ""
+        for i, part in enumerate(parts):
+            path += "/" + part
+            child = node.children.get(part)
+            if child is None:
+                if not create:
+                    raise RuntimeError(f"Нет такой директории: '{path}'")
+                child = DirectoryNode()
+                node.add_child(part, child)
+                self._owned.add(id(child))
+            elif not child.is_dir:
+                raise RuntimeError(f"Невозможно создать '{'/'.join(parts[:i + 1])}': файл блокирует путь")
+            elif self._shared and id(child) not in self._owned:
+                child = node.children[part] = child.copy()
+                self._owned.add(id(child))
+                if path in self._path_index:
+                    self._path_index[path] = child
+            node = child
+        return node
+
+    def fork(self):
+        """Создает независимую версию VFS за O(1): дерево общее, копируется только изменяемый путь.
+
+        Изменения в копии не видны в исходной VFS и наоборот.
+        """
+        child = VirtualFileSystem.__new__(VirtualFileSystem)
+        child.vfs = self.vfs
+        child.lazy = self.lazy
+        child._last_parent_parts = None
+        child._last_parent = None
+        child._snapshot = self._snapshot
+        child._shared = True
+        child._owned = set()
+        child.vfs_path = self.vfs_path
+        child.journal = None
+        child._aggregates = self._aggregates
+        child._search = None
+        child._search_lock = threading.Lock()
+        child.content_cache = self.content_cache
+        # Изменения версии записываются в журнал исходной VFS только при commit()
+        child._fork_log = [] if self.journal is not None or self._fork_log is not None else None
+        child._fork_base = self.vfs
+        child.clear_path_index()
+        self._share()
+        return child
+
+    def commit(self, fork):
+        """Принимает состояние версии, полученной через fork(), как текущее.
+
+        Версия заменяет дерево целиком, а в журнал дописываются только ее изменения, поэтому
+        исходная VFS не должна меняться после fork(): иначе ее изменения пропали бы из дерева,
+        оставшись в журнале.
+        """
+        if fork._fork_base is not self.vfs:
+            # После fork() дерево общее, и любое изменение копирует корень — сравнения по ссылке достаточно
+            raise RuntimeError("commit: VFS изменилась после fork()")
+        for record in fork._fork_log or ():
+            self._log(record)
+        if fork._fork_log:
+            fork._fork_log.clear()
+        self.vfs = fork.vfs
+        fork._fork_base = fork.vfs
+        self._search = fork._search
+        fork._search = None
+        self._share()
+        fork._share()
+        self.clear_path_index()
+
+    def checkpoint(self):
+        """Запоминает текущее состояние дерева за O(1) вместе с позицией журнала и списка
+        изменений версии; вернуться к нему можно через rollback()"""
+        self._share()
+        journal_size = self.journal.size() if self.journal is not None else None
+        log_length = len(self._fork_log) if self._fork_log is not None else None
+        return self.vfs, journal_size, log_length
+
+    def rollback(self, checkpoint):
+        """Возвращает дерево к состоянию, сохраненному checkpoint(); записи журнала
+        и изменения версии после него отбрасываются"""
+        self.vfs, journal_size, log_length = checkpoint
+        if self.journal is not None and journal_size is not None:
+            self.journal.truncate(journal_size)
+        if self._fork_log is not None and log_length is not None:
+            del self._fork_log[log_length:]
+        self._search = None
+        self._share()
+        self.clear_path_index()
+
+    def _share(self):
+        """Отмечает все текущие узлы как общие: дальнейшие изменения пойдут через копирование"""
+        self._shared = True
+        self._owned = set()
+        self._last_parent_parts = None
+        self._last_parent = None
+
+    def _get_parent_path_and_name(self, path, current_path):
+        """Разбивает путь на родительский путь и имя узла"""
+        full_path = normalize_path(current_path, path)
+        if full_path == "/":
+            raise RuntimeError("Невозможно переместить корень")
+        return split_path(full_path)
@@ -0,0 +1,61 @@
+"""Сравнение памяти дерева VFS: узлы-словари (старое представление) против узлов со __slots__.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_memory [число_директорий] [файлов_в_директории]
+"""
+import gc
+import sys
+import tracemalloc
+
+from VfsNode import DirectoryNode, FileNode
+
+
+def build_dict_tree(dirs, files_per_dir):
+    """Строит дерево в старом формате {"type": ..., "content": ...}"""
+    root = {"type": "directory", "content": {}}
+    for d in range(dirs):
+        directory = {"type": "directory", "content": {}}
+        for f in range(files_per_dir):
+            directory["content"][f"file{f}.txt"] = {"type": "file", "content": ""}
+        root["content"][f"dir{d}"] = directory
+    return root
+
+
+def build_slots_tree(dirs, files_per_dir):
+    """Строит то же дерево на DirectoryNode/FileNode с интернированными именами"""
+    root = DirectoryNode()
+    for d in range(dirs):
+        directory = DirectoryNode()
+        for f in range(files_per_dir):
+            directory.children[sys.intern(f"file{f}.txt")] = FileNode("")
+        root.children[sys.intern(f"dir{d}")] = directory
+    return root
+
+
+def measure(builder, *args):
+    """Возвращает число байт, выделенных при построении дерева"""
+    gc.collect()
+    tracemalloc.start()
+    tree = builder(*args)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del tree
+    return size
+
+
+def main():
+    dirs = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    files_per_dir = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    nodes = dirs * (files_per_dir + 1) + 1
+
+    dict_size = measure(build_dict_tree, dirs, files_per_dir)
+    slots_size = measure(build_slots_tree, dirs, files_per_dir)
+
+    print(f"Узлов: {nodes}")
+    print(f"dict-узлы:   {dict_size / 2 ** 20:8.1f} МБ ({dict_size / nodes:6.1f} Б/узел)")
+    print(f"slots-узлы:  {slots_size / 2 ** 20:8.1f} МБ ({slots_size / nodes:6.1f} Б/узел)")
+    print(f"Экономия:    {(1 - slots_size / dict_size) * 100:8.1f} %")
+
+
+if __name__ == "__main__":
+    main()
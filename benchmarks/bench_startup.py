@@ -0,0 +1,139 @@
+"""Бенчмарк запуска эмулятора: время до приглашения и до ответа на первую команду.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_startup --json startup.json
+    python -m benchmarks.bench_startup --compare startup.json   # сравнение с прошлым прогоном
+
+Каждый замер — отдельный процесс `python main.py <VFS>` в интерактивном режиме: время до
+появления приглашения, затем время ответа на `ls /` (ждет окончания фоновой загрузки VFS).
+Результаты — JSON с медианой/минимумом времени каждого замера в секундах.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_vfs import compare
+from benchmarks.generate_vfs import generate_vfs_csv
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROMPT = b"$ "
+
+
+def read_until(fd, marker, buffer=b""):
+    """Читает вывод процесса, пока в нем не появится marker; возвращает прочитанное после него"""
+    while marker not in buffer:
+        data = os.read(fd, 65536)
+        if not data:
+            raise RuntimeError(f"процесс завершился, не выведя {marker!r}")
+        buffer += data
+    return buffer[buffer.index(marker) + len(marker):]
+
+
+def time_session(vfs_path, command):
+    """Один интерактивный сеанс: (время до приглашения, время ответа на первую команду)"""
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "main.py", vfs_path], cwd=ROOT,
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    try:
+        fd = process.stdout.fileno()
+        rest = read_until(fd, PROMPT)
+        prompt = time.perf_counter() - start
+
+        start = time.perf_counter()
+        process.stdin.write(f"{command}\n".encode("utf-8"))
+        process.stdin.flush()
+        read_until(fd, PROMPT, rest)
+        first_command = time.perf_counter() - start
+
+        process.stdin.write(b"exit\n")
+        process.stdin.close()
+        process.wait()
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+    return prompt, first_command
+
+
+def time_process(code):
+    """Время выполнения `python -c code` в корне проекта"""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True)
+    return time.perf_counter() - start
+
+
+def stats(times):
+    return {"median": statistics.median(times), "min": min(times), "repeat": len(times)}
+
+
+def run_benchmarks(args, workdir):
+    csv_path = os.path.join(workdir, "vfs.csv")
+    image = generate_vfs_csv(csv_path, args.depth, args.fanout, args.files, args.file_size,
+                             args.b64_share, 0, args.large_file, args.seed)
+
+    prompt_times = []
+    command_times = []
+    interpreter_times = []
+    import_times = []
+    for _ in range(args.repeat):
+        prompt, first_command = time_session(csv_path, args.command)
+        prompt_times.append(prompt)
+        command_times.append(first_command)
+        interpreter_times.append(time_process("pass"))
+        import_times.append(time_process("import main"))
+
+    results = {
+        "time_to_prompt": stats(prompt_times),
+        "first_command": stats(command_times),
+        "interpreter": stats(interpreter_times),
+        "import_main": stats(import_times),
+    }
+
+    meta = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "image": image,
+        "params": {key: value for key, value in vars(args).items() if key not in ("json", "compare")},
+    }
+    return {"meta": meta, "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк запуска эмулятора")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--fanout", type=int, default=8)
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--file-size", type=int, default=256)
+    parser.add_argument("--b64-share", type=float, default=0.3)
+    parser.add_argument("--large-file", type=int, default=8 * 2 ** 20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--command", default="ls /", help="первая команда сеанса")
+    parser.add_argument("--json", help="куда сохранить результаты (по умолчанию — stdout)")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--threshold", type=float, default=1.2, help="допустимое замедление при сравнении")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        report = run_benchmarks(args, workdir)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    elif not args.compare:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+
+    if args.compare and not compare(report, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""Набор бенчмарков VFS и эмулятора на синтетическом образе.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_vfs --json results.json
+    python -m benchmarks.bench_vfs --compare results.json   # сравнение с прошлым прогоном
+
+Результаты — JSON с медианой/минимумом времени каждого замера в секундах.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+from ShellEmulator import ShellEmulator
+from OutputSink import MemorySink
+from VirtualFileSystem import VirtualFileSystem, normalize_path
+from benchmarks.generate_vfs import generate_vfs_csv
+
+
+def measure(run, repeat, setup=None):
+    """Запускает run(state) `repeat` раз; setup() готовит состояние вне замера"""
+    times = []
+    for _ in range(repeat):
+        state = setup() if setup else None
+        start = time.perf_counter()
+        run(state)
+        times.append(time.perf_counter() - start)
+    return {"median": statistics.median(times), "min": min(times), "repeat": repeat}
+
+
+def collect_paths(vfs):
+    """Возвращает абсолютные пути всех узлов дерева"""
+    paths = []
+    stack = [("", vfs.vfs)]
+    while stack:
+        prefix, node = stack.pop()
+        for name, child in node.children.items():
+            path = f"{prefix}/{name}"
+            paths.append(path)
+            if child.is_dir:
+                stack.append((path, child))
+    return paths
+
+
+def reset_path_cache(vfs):
+    """Сбрасывает индекс путей и кэш нормализации — холодное разрешение путей"""
+    vfs.clear_path_index()
+    normalize_path.cache_clear()
+
+
+def write_script(path, dirs, lines):
+    """Пишет скрипт только из читающих команд по директориям образа"""
+    commands = []
+    while len(commands) < lines:
+        for directory in dirs:
+            commands.extend([f"cd {directory}", "ls", "pwd", "cat file0.txt"])
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(commands[:lines]) + "\n")
+
+
+def run_benchmarks(args, workdir):
+    csv_path = os.path.join(workdir, "vfs.csv")
+    snapshot_path = os.path.join(workdir, "vfs.snapshot")
+    tar_path = os.path.join(workdir, "vfs.tar")
+    jsonl_path = os.path.join(workdir, "vfs.jsonl")
+    script_path = os.path.join(workdir, "script.txt")
+
+    image = generate_vfs_csv(csv_path, args.depth, args.fanout, args.files, args.file_size,
+                             args.b64_share, args.huge_dir, args.large_file, args.seed)
+    source = VirtualFileSystem(csv_path)
+    source.save_snapshot(snapshot_path)
+    source.save_tar(tar_path)
+    source.save_jsonl(jsonl_path)
+    del source
+
+    results = {}
+    repeat = args.repeat
+
+    results["load_csv_lazy"] = measure(lambda _: VirtualFileSystem(csv_path), repeat)
+    results["load_csv_eager"] = measure(lambda _: VirtualFileSystem(csv_path, lazy=False), repeat)
+    results["load_snapshot"] = measure(lambda _: VirtualFileSystem(snapshot_path), repeat)
+    results["load_tar"] = measure(lambda _: VirtualFileSystem(tar_path), repeat)
+    results["load_jsonl"] = measure(lambda _: VirtualFileSystem(jsonl_path), repeat)
+
+    vfs = VirtualFileSystem(csv_path)
+    paths = collect_paths(vfs)
+    deep_path = max(paths, key=lambda p: p.count("/"))
+    lookups = args.lookups
+
+    def resolve_hot(_):
+        for _ in range(lookups):
+            vfs.resolve_path("/", deep_path)
+
+    def resolve_cold(_):
+        for path in paths:
+            vfs.resolve_path("/", path)
+
+    results["resolve_hot"] = measure(resolve_hot, repeat)
+    results["resolve_cold"] = measure(resolve_cold, repeat, setup=lambda: reset_path_cache(vfs))
+
+    shell = ShellEmulator(csv_path, output=MemorySink())
+    if args.huge_dir:
+        results["ls_huge_dir"] = measure(lambda _: shell.run_command("ls /huge"), repeat,
+                                         setup=shell.out.clear)
+        # Страница из середины и фильтр по префиксу — срезы индекса имен, без сортировки всей директории
+        page = f"ls --offset={args.huge_dir // 2} --limit=100 /huge"
+        results["ls_huge_dir_page"] = measure(lambda _: shell.run_command(page), repeat,
+                                              setup=shell.out.clear)
+        results["ls_huge_dir_prefix"] = measure(lambda _: shell.run_command("ls /huge/entry00099*"), repeat,
+                                                setup=shell.out.clear)
+    if args.large_file:
+        # Первый cat включает декодирование, поэтому каждый прогон — на свежем VFS
+        def fresh_shell():
+            return ShellEmulator(csv_path, output=MemorySink())
+
+        results["cat_large_file"] = measure(lambda sh: sh.run_command("cat /large.log"), repeat,
+                                            setup=fresh_shell)
+
+    def move_back_and_forth(_):
+        for _ in range(lookups // 10):
+            vfs.move_node("/", "/data/dir0", "/data/moved")
+            vfs.move_node("/", "/data/moved", "/data/dir0")
+
+    results["move_node"] = measure(move_back_and_forth, repeat)
+
+    def fork_and_move(_):
+        for _ in range(lookups // 10):
+            vfs.fork().move_node("/", "/data/dir0/dir0", "/data/moved")
+
+    results["fork_move"] = measure(fork_and_move, repeat)
+
+    dirs = sorted({p.rsplit("/", 1)[0] or "/" for p in paths if p.startswith("/data/") and p.endswith("file0.txt")})
+    write_script(script_path, dirs, args.script_lines)
+
+    def script_shell():
+        return ShellEmulator(csv_path, script_path, output=MemorySink())
+
+    results["script_run"] = measure(lambda sh: sh.run(), repeat, setup=script_shell)
+
+    meta = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "image": image,
+        "params": {key: value for key, value in vars(args).items() if key not in ("json", "compare")},
+    }
+    return {"meta": meta, "results": results}
+
+
+def compare(report, baseline_path, threshold):
+    """Печатает отношение медиан к базовому прогону; возвращает True, если регрессий нет"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+
+    ok = True
+    for name, result in report["results"].items():
+        if name not in baseline:
+            continue
+        ratio = result["median"] / baseline[name]["median"] if baseline[name]["median"] else float("inf")
+        marker = ""
+        if ratio > threshold:
+            marker = "  <-- регрессия"
+            ok = False
+        print(f"{name:16} {ratio:6.2f}x{marker}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки VFS и эмулятора")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--fanout", type=int, default=8)
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--file-size", type=int, default=256)
+    parser.add_argument("--b64-share", type=float, default=0.3)
+    parser.add_argument("--huge-dir", type=int, default=100000)
+    parser.add_argument("--large-file", type=int, default=8 * 2 ** 20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--lookups", type=int, default=100000)
+    parser.add_argument("--script-lines", type=int, default=20000)
+    parser.add_argument("--json", help="куда сохранить результаты (по умолчанию — stdout)")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--threshold", type=float, default=1.2, help="допустимое замедление при сравнении")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        report = run_benchmarks(args, workdir)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    elif not args.compare:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+
+    if args.compare and not compare(report, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
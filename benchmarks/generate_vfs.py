@@ -0,0 +1,115 @@
+"""Генератор синтетических CSV-образов VFS заданного размера.
+
+Запуск из корня проекта:
+    python -m benchmarks.generate_vfs out.csv --depth 3 --fanout 10 --files 20 --file-size 256 --b64-share 0.3
+"""
+import argparse
+import base64
+import csv
+import random
+
+WORDS = ["alpha", "beta", "gamma", "delta", "error", "warning", "info", "debug", "kernel", "user",
+         "request", "response", "timeout", "disk", "memory", "network", "cache", "index"]
+
+
+def make_corpus(rng, size=1 << 20):
+    """Строит пул текста из строк со случайными словами; файлы нарезаются из него"""
+    lines = []
+    length = 0
+    while length < size:
+        line = " ".join(rng.choice(WORDS) for _ in range(8))
+        lines.append(line)
+        length += len(line) + 1
+    return "\n".join(lines)
+
+
+def make_text(rng, corpus, size):
+    """Возвращает текст заданного размера со случайного места пула"""
+    while len(corpus) < size:
+        corpus += "\n" + corpus
+    start = rng.randrange(len(corpus) - size + 1)
+    return corpus[start:start + size]
+
+
+def generate_vfs_csv(path, depth=3, fanout=10, files=20, file_size=256, b64_share=0.0,
+                     huge_dir_files=0, large_file_size=0, seed=0):
+    """Пишет CSV-образ VFS и возвращает словарь с его характеристиками.
+
+    Дерево: /data с `depth` уровнями по `fanout` поддиректорий, в каждой директории `files`
+    файлов по `file_size` байт; доля `b64_share` файлов хранится в колонке content_b64.
+    Дополнительно: /huge с `huge_dir_files` файлами и /large.log размером `large_file_size`.
+    """
+    rng = random.Random(seed)
+    corpus = make_corpus(rng)
+    stats = {"directories": 0, "files": 0, "bytes": 0}
+
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["path", "type", "content", "content_b64"])
+
+        def write_dir(dir_path):
+            writer.writerow([dir_path, "directory", "", ""])
+            stats["directories"] += 1
+
+        def write_file(file_path, size):
+            text = make_text(rng, corpus, size)
+            if rng.random() < b64_share:
+                encoded = base64.b64encode(text.encode("utf-8")).decode("ascii")
+                writer.writerow([file_path, "file", "", encoded])
+            else:
+                writer.writerow([file_path, "file", text, ""])
+            stats["files"] += 1
+            stats["bytes"] += size
+
+        write_dir("/home")
+        write_dir("/home/user")
+        writer.writerow(["/motd", "file", "Benchmark VFS", ""])
+
+        # Обход в ширину: строки одной директории идут подряд, как в реальных образах
+        level = ["/data"]
+        write_dir("/data")
+        for current_depth in range(depth + 1):
+            next_level = []
+            for dir_path in level:
+                for i in range(files):
+                    write_file(f"{dir_path}/file{i}.txt", file_size)
+                if current_depth < depth:
+                    for i in range(fanout):
+                        child = f"{dir_path}/dir{i}"
+                        write_dir(child)
+                        next_level.append(child)
+            level = next_level
+
+        if huge_dir_files:
+            write_dir("/huge")
+            for i in range(huge_dir_files):
+                writer.writerow([f"/huge/entry{i:07d}.dat", "file", "x", ""])
+                stats["files"] += 1
+                stats["bytes"] += 1
+
+        if large_file_size:
+            write_file("/large.log", large_file_size)
+
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генератор синтетического CSV-образа VFS")
+    parser.add_argument("output", help="путь к создаваемому CSV")
+    parser.add_argument("--depth", type=int, default=3, help="глубина дерева /data")
+    parser.add_argument("--fanout", type=int, default=10, help="число поддиректорий в директории")
+    parser.add_argument("--files", type=int, default=20, help="число файлов в директории")
+    parser.add_argument("--file-size", type=int, default=256, help="размер файла в байтах")
+    parser.add_argument("--b64-share", type=float, default=0.0, help="доля файлов в base64 (0..1)")
+    parser.add_argument("--huge-dir", type=int, default=0, help="число файлов в /huge")
+    parser.add_argument("--large-file", type=int, default=0, help="размер /large.log в байтах")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    stats = generate_vfs_csv(args.output, args.depth, args.fanout, args.files, args.file_size,
+                             args.b64_share, args.huge_dir, args.large_file, args.seed)
+    print(f"{args.output}: {stats['directories']} директорий, {stats['files']} файлов, {stats['bytes']} байт")
+
+
+if __name__ == "__main__":
+    main()
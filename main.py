@@ -1,26 +1,95 @@
 import sys
 import os
 from ShellEmulator import ShellEmulator
+from OutputSink import FileSink, TerminalSink
 
 
 def main():
     # Обработка параметров командной строки
-    if len(sys.argv) not in [1, 3]:
-        print("Использование:")
-        print("  Интерактивный режим: python main.py")
-        print("  Режим скрипта: python main.py <путь_к_VFS> <путь_к_скрипту>")
-        print("Пример: python main.py utils/vfs_structure.csv tests/test_script_stage4.txt")
+    echo = True
+    output_path = None
+    stats = False
+    stats_path = None
+    workers = None
+    serve_address = None
+    journal = None
+    compact = False
+    batch = False
+    export_path = None
+    cache_bytes = None
+    jobs = None
+    args = []
+    for arg in sys.argv[1:]:
+        if arg in ("--quiet", "--no-echo"):
+            echo = False
+        elif arg.startswith("--output="):
+            output_path = arg[len("--output="):]
+        elif arg.startswith("--serve="):
+            serve_address = arg[len("--serve="):]
+        elif arg == "--journal":
+            journal = True
+        elif arg.startswith("--journal="):
+            journal = arg[len("--journal="):]
+        elif arg == "--compact":
+            compact = True
+        elif arg.startswith("--cache="):
+            cache_bytes = option_value(arg, parse_size)
+        elif arg.startswith("--export="):
+            export_path = arg[len("--export="):]
+        elif arg == "--batch":
+            batch = True
+        elif arg.startswith("--jobs="):
+            jobs = option_value(arg, positive_int)
+        elif arg.startswith("--workers="):
+            workers = option_value(arg, positive_int)
+        elif arg == "--stats":
+            stats = True
+        elif arg.startswith("--stats="):
+            stats = True
+            stats_path = arg[len("--stats="):]
+        else:
+            args.append(arg)
+
+    if serve_address or compact or export_path:
+        # Эти режимы принимают не более одного пути — к VFS
+        if len(args) > 1:
+            print("Ожидается не более одного пути к VFS")
+            sys.exit(1)
+        vfs_path = args[0] if args else "utils/vfs_structure.csv"
+        if not os.path.exists(vfs_path):
+            print(f"Ошибка: файл VFS '{vfs_path}' не существует")
+            sys.exit(1)
+        # Сервер (asyncio) нужен только в этом режиме — не замедляем им обычный запуск
+        from VirtualFileSystem import VirtualFileSystem
+        journal_path = journal_path_for(vfs_path, journal if journal else compact)
+        vfs = VirtualFileSystem(vfs_path, workers=workers, journal=journal_path, cache_bytes=cache_bytes)
+        if export_path:
+            # Формат результата — по расширению: .tar[.gz|.bz2|.xz], .jsonl, .vfs (снимок) или CSV
+            vfs.save_image(export_path)
+            print(f"VFS '{vfs_path}' сохранена в '{export_path}'")
+        elif compact:
+            vfs.compact()
+            print(f"Журнал '{journal_path}' применен к '{vfs_path}' и очищен")
+        else:
+            from ShellServer import ShellServer
+            ShellServer(vfs).run(serve_address)
+        return
+
+    if batch:
+        sys.exit(0 if run_batch_mode(args, echo, output_path, workers, jobs, cache_bytes) else 1)
+
+    if len(args) > 2:
+        print_usage()
         sys.exit(1)
 
     # Режим работы
-    if len(sys.argv) == 1:
+    if len(args) < 2:
         # Интерактивный режим
-        vfs_path = "utils/vfs_structure.csv"  # путь по умолчанию (CSV)
+        vfs_path = args[0] if args else "utils/vfs_structure.csv"  # путь по умолчанию (CSV)
         script_path = None
     else:
         # Режим скрипта
-        vfs_path = sys.argv[1]
-        script_path = sys.argv[2]
+        vfs_path, script_path = args
 
     # Проверка существования файла VFS
     if not os.path.exists(vfs_path):
@@ -33,7 +102,7 @@ def main():
         sys.exit(1)
 
     # Отладочный вывод параметров (только в режиме скрипта)
-    if script_path:
+    if script_path and echo:
         print("-" * 50)
         print("Конфигурация эмулятора")
         print("-" * 50)
@@ -43,13 +112,117 @@ def main():
         print()
 
     try:
-        shell = ShellEmulator(vfs_path, script_path)
-        success = shell.run()
+        output = FileSink(output_path) if output_path else None
+        # В интерактивном режиме VFS грузится в фоне, пока пользователь видит приглашение
+        shell = ShellEmulator(vfs_path, script_path, echo=echo, output=output, stats=stats,
+                              workers=workers, journal=journal_path_for(vfs_path, journal),
+                              background=script_path is None, cache_bytes=cache_bytes)
+        try:
+            success = shell.run()
+        finally:
+            if shell.stats and script_path:
+                # В режиме скрипта статистика выгружается в JSON при выходе, в том числе по ошибке
+                if stats_path:
+                    with open(stats_path, "w", encoding="utf-8") as f:
+                        f.write(shell.stats.to_json(shell.vfs))
+                else:
+                    shell.out.line(shell.stats.to_json(shell.vfs))
+            shell.out.close()
         if not success:
             sys.exit(1)
     except Exception as e:
         sys.exit(1)
 
 
+def run_batch_mode(args, echo, output_path, workers, jobs, cache_bytes):
+    """Выполняет пакет скриптов на одной загруженной VFS; True, если все завершились успешно"""
+    if len(args) != 2:
+        print("Пакетный режим: python main.py --batch <путь_к_VFS> <директория_или_glob_скриптов>")
+        return False
+    vfs_path, pattern = args
+    if not os.path.exists(vfs_path):
+        print(f"Ошибка: файл VFS '{vfs_path}' не существует")
+        return False
+
+    from BatchRunner import find_scripts, run_batch
+    from VirtualFileSystem import VirtualFileSystem
+    scripts = find_scripts(pattern)
+    if not scripts:
+        print(f"Ошибка: скрипты по '{pattern}' не найдены")
+        return False
+
+    out = FileSink(output_path) if output_path else TerminalSink()
+    try:
+        vfs = VirtualFileSystem(vfs_path, workers=workers, cache_bytes=cache_bytes)
+        failed = []
+        # Вывод каждого скрипта печатается целиком и в порядке списка, независимо от порядка завершения
+        for script_path, output, status in run_batch(vfs, scripts, jobs=jobs, echo=echo):
+            out.line(f"==> {script_path} <==")
+            out.write(output)
+            out.line(f"[код завершения: {status}]")
+            out.line()
+            if status:
+                failed.append(script_path)
+        out.line(f"Скриптов: {len(scripts)}, успешно: {len(scripts) - len(failed)}, с ошибкой: {len(failed)}")
+        for script_path in failed:
+            out.line(f"  ошибка: {script_path}")
+        return not failed
+    finally:
+        out.close()
+
+
+def print_usage():
+    """Справка по параметрам командной строки"""
+    print("Использование:")
+    print("  Интерактивный режим: python main.py [<путь_к_VFS>]")
+    print("  Режим скрипта: python main.py [--quiet|--no-echo] [--output=<файл>] [--stats[=<файл>]] [--workers=N] "
+          "<путь_к_VFS> <путь_к_скрипту>")
+    print("  Пакетный режим: python main.py --batch [--jobs=N] [--quiet] [--output=<файл>] "
+          "<путь_к_VFS> <директория_или_glob_скриптов>")
+    print("  Режим сервера: python main.py --serve=<host:port|unix:путь> [--workers=N] [<путь_к_VFS>]")
+    print("  Память под содержимое файлов: --cache=<размер>[K|M|G] (холодное содержимое вытесняется на диск)")
+    print("  Журнал изменений: --journal[=<файл>] (по умолчанию <путь_к_VFS>.journal)")
+    print("  Сжатие журнала в новый образ: python main.py --compact [--journal=<файл>] <путь_к_VFS>")
+    print("  Преобразование образа: python main.py --export=<файл.tar|.tar.gz|.jsonl|.vfs|.csv> <путь_к_VFS>")
+    print("Пример: python main.py utils/vfs_structure.csv tests/test_script_stage4.txt")
+    print("VFS может быть CSV-файлом, tar-архивом (.tar, .tar.gz, ...), JSON Lines (.jsonl) "
+          "или бинарным снимком (python VfsSnapshot.py <CSV> <снимок>)")
+
+
+def option_value(arg, parse):
+    """Значение параметра вида --имя=значение; неверное значение — сообщение, справка и выход"""
+    name, _, text = arg.partition("=")
+    try:
+        return parse(text)
+    except ValueError:
+        print(f"Ошибка: неверное значение параметра {name}: '{text}'")
+        print_usage()
+        sys.exit(1)
+
+
+def positive_int(text):
+    """Целое число больше нуля"""
+    value = int(text)
+    if value < 1:
+        raise ValueError(text)
+    return value
+
+
+def parse_size(text):
+    """Размер в байтах: число с необязательным суффиксом K, M или G"""
+    multiplier = 1
+    if text[-1:].upper() in ("K", "M", "G"):
+        multiplier = 1024 ** ("KMG".index(text[-1].upper()) + 1)
+        text = text[:-1]
+    return positive_int(text) * multiplier
+
+
+def journal_path_for(vfs_path, journal):
+    """Путь к журналу: явный, по умолчанию рядом с образом (--journal) или None"""
+    if journal is True:
+        return vfs_path + ".journal"
+    return journal or None
+
+
 if __name__ == "__main__":
     main()
\ No newline at end of file